@@ -0,0 +1,180 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts.cache import GENERATION_KEY
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {index}', group=cls.group
+            )
+            for index in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_json(self, client, url, **params):
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_feeds_return_same_posts_as_html(self):
+        """Ленты API отдают те же посты, что и HTML-страницы."""
+        feeds = {
+            reverse('api:main'): self.client,
+            reverse('api:group', args=[self.group.slug]): self.client,
+            reverse('api:profile', args=[self.author.username]):
+                self.client,
+            reverse('api:follow_index'): self.authorized_client,
+        }
+        expected = [post.pk for post in reversed(self.posts)]
+        for url, client in feeds.items():
+            with self.subTest(url=url):
+                _, data = self.get_json(client, url)
+                self.assertEqual(
+                    [row['id'] for row in data['results']], expected
+                )
+                self.assertEqual(
+                    data['results'][0]['author_username'], 'auth'
+                )
+                self.assertEqual(
+                    data['results'][0]['group_slug'], 'test-slug'
+                )
+
+    def test_profile_and_group_metadata(self):
+        _, data = self.get_json(
+            self.client, reverse('api:profile', args=['auth'])
+        )
+        self.assertEqual(data['author']['posts_count'], 3)
+        self.assertEqual(data['author']['followers_count'], 1)
+        _, data = self.get_json(
+            self.client, reverse('api:group', args=['test-slug'])
+        )
+        self.assertEqual(data['group']['title'], 'Тестовая группа')
+
+    def test_post_detail_with_comments(self):
+        _, data = self.get_json(
+            self.client, reverse('api:post_detail', args=[self.posts[0].pk])
+        )
+        self.assertEqual(data['post']['text'], 'Пост 0')
+        self.assertEqual(data['post']['comments_count'], 1)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий'],
+        )
+
+    @override_settings(COMMENTS_PAGE=2)
+    def test_post_detail_comments_paginated(self):
+        """Комментарии поста отдаются страницами по курсору."""
+        post = self.posts[1]
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'Комментарий {index}')
+            for index in range(3)
+        )
+        url = reverse('api:post_detail', args=[post.pk])
+        _, first = self.get_json(self.client, url)
+        _, second = self.get_json(self.client, url, cursor=first['next'])
+        self.assertEqual(
+            [comment['text'] for comment in first['comments']],
+            ['Комментарий 0', 'Комментарий 1'],
+        )
+        self.assertEqual(
+            [comment['text'] for comment in second['comments']],
+            ['Комментарий 2'],
+        )
+        self.assertIsNone(second['next'])
+
+    @override_settings(PAGINATOR_PAGE=2)
+    def test_cursor_pagination(self):
+        """Следующая страница запрашивается по курсору."""
+        url = reverse('api:main')
+        _, first = self.get_json(self.client, url)
+        _, second = self.get_json(self.client, url, cursor=first['next'])
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual(
+            [row['id'] for row in second['results']], [self.posts[0].pk]
+        )
+        self.assertIsNone(second['next'])
+
+    def test_not_modified(self):
+        """Неизменившаяся лента отвечает 304 без запросов к базе."""
+        url = reverse('api:main')
+        response, _ = self.get_json(self.client, url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with run_on_commit():
+            Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_follows_author_and_group(self):
+        """Смена адреса группы или имени автора меняет ETag поста."""
+        url = reverse('api:post_detail', args=[self.posts[0].pk])
+
+        def rename():
+            author = User.objects.get(pk=self.author.pk)
+            author.first_name = 'Новое имя'
+            author.save()
+
+        for change in (
+            lambda: Group.objects.get(pk=self.group.pk).save(),
+            rename,
+        ):
+            response, _ = self.get_json(self.client, url)
+            etag = response['ETag']
+            with run_on_commit():
+                change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_missing_post_leaves_no_generation(self):
+        url = reverse('api:post_detail', args=[0])
+        self.client.get(url)
+        self.assertIsNone(cache.get(GENERATION_KEY.format('post:0')))
+
+    def test_not_found_and_anonymous_follow(self):
+        urls = {
+            reverse('api:group', args=['missing']): 404,
+            reverse('api:profile', args=['missing']): 404,
+            reverse('api:post_detail', args=[0]): 404,
+            reverse('api:follow_index'): 401,
+        }
+        for url, status in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
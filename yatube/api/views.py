@@ -0,0 +1,202 @@
+"""Read-only JSON API лент для мобильного клиента.
+
+Ленты берутся из тех же запросов, что и HTML-страницы, но читаются
+через values(): модели не создаются, а строки сразу кодируются в
+компактный JSON и отдаются потоком. ETag и Last-Modified считаются по
+поколениям кэша (см. posts.cache) до обращения к базе, поэтому ответ
+304 на неизменившуюся ленту обходится без SQL-запросов к постам (для
+отдельного поста — одним запросом по первичному ключу).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from posts.cache import scope_validators
+from posts.feed import FEED_ORDERING, feed_for
+from posts.models import Comment, Group, Post
+from posts.utils import COMMENT_ORDERING, DEFAULT_ORDERING, CursorPaginator
+
+User = get_user_model()
+
+POST_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'author__username',
+    'group__slug',
+    'image',
+    'comments_count',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+STATS_FIELDS = (
+    'stats__posts_count',
+    'stats__followers_count',
+    'stats__following_count',
+)
+
+encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def _row(values, fields):
+    row = {field.replace('__', '_'): values[field] for field in fields}
+    if row.get('image'):
+        row['image'] = default_storage.url(row['image'])
+    return row
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+
+def _validators(request, scopes):
+    """Возвращает (etag, last_modified, ответ 304/412 или None)."""
+    etag, last_modified = scope_validators(
+        scopes, request.get_full_path(), request.user.pk
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    return etag, last_modified, response
+
+
+def _stream(chunks, etag, last_modified):
+    response = StreamingHttpResponse(
+        chunks, content_type='application/json'
+    )
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, max_age=0)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _feed(request, scopes, queryset, ordering=DEFAULT_ORDERING,
+          extra=None):
+    etag, last_modified, response = _validators(request, scopes)
+    if response is not None:
+        return response
+    keys = [name.lstrip('-') for name in ordering]
+    paginator = CursorPaginator(
+        queryset.values(*POST_FIELDS, *keys),
+        settings.PAGINATOR_PAGE,
+        ordering,
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+
+    def chunks():
+        yield '{'
+        for key, value in (extra or {}).items():
+            yield f'{encoder.encode(key)}:{encoder.encode(value)},'
+        yield '"results":['
+        for index, values in enumerate(page):
+            yield (',' if index else '') + encoder.encode(
+                _row(values, POST_FIELDS)
+            )
+        yield '],"next":{},"previous":{}}}'.format(
+            encoder.encode(page.next_cursor),
+            encoder.encode(page.previous_cursor),
+        )
+
+    return _stream(chunks(), etag, last_modified)
+
+
+@require_safe
+def index(request):
+    return _feed(request, ('posts',), Post.objects.for_feed())
+
+
+@require_safe
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'id', 'title', 'slug', 'description'
+    ).first()
+    if group is None:
+        return _not_found()
+    scopes = (f'group:{group["id"]}', f'group:{group["id"]}:meta')
+    return _feed(
+        request,
+        scopes,
+        Post.objects.for_feed().filter(group_id=group['id']),
+        extra={'group': group},
+    )
+
+
+@require_safe
+def profile(request, username):
+    author = User.objects.filter(username=username).values(
+        'id', 'username', 'first_name', 'last_name', *STATS_FIELDS
+    ).first()
+    if author is None:
+        return _not_found()
+    for field in STATS_FIELDS:
+        # у пользователей без строки статистики счётчики пустые
+        author[field.replace('stats__', '')] = author.pop(field) or 0
+    return _feed(
+        request,
+        (f'author:{author["id"]}',),
+        Post.objects.for_feed().filter(author_id=author['id']),
+        extra={'author': author},
+    )
+
+
+@require_safe
+def post_detail(request, post_id):
+    # автор и группа нужны для областей до проверки поколений: без
+    # этого несуществующий id заводил бы ключ поколения в кэше
+    owner = (Post.objects.filter(pk=post_id)
+             .values_list('author_id', 'group_id').first())
+    if owner is None:
+        return _not_found()
+    author_id, group_id = owner
+    # в ответе есть имя автора и адрес группы, как и на HTML-странице
+    scopes = [f'post:{post_id}', f'author:{author_id}']
+    if group_id:
+        scopes.append(f'group:{group_id}:meta')
+    etag, last_modified, response = _validators(request, scopes)
+    if response is not None:
+        return response
+    post = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if post is None:
+        return _not_found()
+    # комментарии страницами, как на HTML-странице поста
+    page = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        settings.COMMENTS_PAGE,
+        COMMENT_ORDERING,
+    ).get_page(request.GET.get('cursor'))
+
+    def chunks():
+        yield '{"post":%s,"comments":[' % encoder.encode(
+            _row(post, POST_FIELDS)
+        )
+        for index, values in enumerate(page):
+            yield (',' if index else '') + encoder.encode(
+                _row(values, COMMENT_FIELDS)
+            )
+        yield '],"next":{},"previous":{}}}'.format(
+            encoder.encode(page.next_cursor),
+            encoder.encode(page.previous_cursor),
+        )
+
+    return _stream(chunks(), etag, last_modified)
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Нужно войти в систему.'}, status=401
+        )
+    return _feed(
+        request,
+        ('posts', f'author:{request.user.pk}'),
+        feed_for(request.user),
+        FEED_ORDERING,
+    )
@@ -0,0 +1,39 @@
+"""SQLite с настройками для продакшена.
+
+При каждом подключении включает WAL (читатели не ждут писателя),
+synchronous=NORMAL, mmap, увеличенный кэш страниц и ожидание
+блокировки вместо мгновенной ошибки ``database is locked``. Значения
+по умолчанию можно переопределить в ``OPTIONS['pragmas']``.
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение — размер в килобайтах
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_pragmas(connection, pragmas):
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        return connection
@@ -0,0 +1,28 @@
+"""Шаблоны Django с замером времени отрисовки для core.perf.
+
+Замеряется только шаблон, который отрисовывает представление: вложенные
+{% include %} и {% extends %} входят в его время.
+"""
+from django.template.backends import django
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        from core.perf import current
+
+        recorder = current()
+        if recorder is None:
+            return super().render(context, request)
+        with recorder.template():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django.TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
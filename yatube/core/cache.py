@@ -0,0 +1,51 @@
+"""Защита от лавины пересчётов при истечении горячего ключа.
+
+Значение хранится вместе со временем вычисления и сроком годности.
+Незадолго до истечения один из запросов с вероятностью, растущей по
+мере приближения срока, берёт блокировку и пересчитывает значение
+(probabilistic early recomputation, XFetch), остальные продолжают
+отдавать старое. Если значения нет совсем, ждёт результата победителя
+не дольше COMPUTE_WAIT секунд.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+LOCK_TIMEOUT = 30
+COMPUTE_WAIT = 5
+POLL_INTERVAL = 0.05
+
+
+def _store(cache, key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    cache.set(key, (value, delta, time.time() + timeout), timeout)
+    return value
+
+
+def get_or_compute(key, compute, timeout, beta=1.0, cache=None):
+    cache = cache or default_cache
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires = entry
+        early = delta * beta * -math.log(1.0 - random.random())
+        if time.time() + early < expires:
+            return value
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + COMPUTE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return _store(cache, key, compute, timeout)
+    try:
+        return _store(cache, key, compute, timeout)
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.utils import load_backend
+
+from core.perf import percentile
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+ENGINES = (
+    ('default', 'django.db.backends.sqlite3'),
+    ('tuned', 'core.backends.sqlite3'),
+)
+POSTS = 1000
+AUTHORS = 100
+# пауза перед повтором после database is locked: от 1 до 64 мс
+BACKOFF = (0.001, 0.064)
+
+
+def _backoff(attempt):
+    limit = min(BACKOFF[0] * 2 ** attempt, BACKOFF[1])
+    time.sleep(random.uniform(limit / 2, limit))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение комментариев SQLite под параллельным '
+            'добавлением комментариев через ORM (как add_comment, с '
+            'сигналами) со стандартным и настроенным бэкендом. Замер '
+            'идёт на временной копии схемы, рабочая база не меняется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести результат в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            template = os.path.join(directory, 'template.sqlite3')
+            self._in_database(
+                self._settings(template, ENGINES[0][1]),
+                lambda: self._prepare(options['rows']),
+            )
+            for label, engine in ENGINES:
+                path = os.path.join(directory, f'{label}.sqlite3')
+                shutil.copy(template, path)
+                results.append(self._run(
+                    label, self._settings(path, engine), options
+                ))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                '{label:>8}: чтений {reads_per_second:9.1f}/с, '
+                'p95 {read_p95_ms:7.2f} мс, '
+                'записей {writes_per_second:7.1f}/с, '
+                'ошибок блокировки {lock_errors}'.format(**result)
+            )
+
+    def _settings(self, path, engine):
+        settings_dict = dict(connections.databases['default'])
+        settings_dict.update(
+            ENGINE=engine, NAME=path, OPTIONS={}, CONN_MAX_AGE=0,
+            TEST=dict(settings_dict.get('TEST', {})),
+        )
+        return settings_dict
+
+    def _thread(self, settings_dict, target):
+        """Поток, в котором connection 'default' ведёт во временную базу.
+
+        Соединения Django у каждого потока свои, поэтому основной поток
+        (и база тестов, если команду зовут из них) остаётся нетронутым,
+        а модели и обработчики сигналов работают как в запросе.
+        """
+
+        def run():
+            backend = load_backend(settings_dict['ENGINE'])
+            connections['default'] = backend.DatabaseWrapper(
+                settings_dict, 'default'
+            )
+            try:
+                target()
+            finally:
+                connections['default'].close()
+
+        return threading.Thread(target=run)
+
+    def _in_database(self, settings_dict, target):
+        thread = self._thread(settings_dict, target)
+        thread.start()
+        thread.join()
+
+    def _prepare(self, rows):
+        call_command('migrate', verbosity=0, interactive=False)
+        User.objects.bulk_create(
+            User(username=f'bench{index}') for index in range(AUTHORS)
+        )
+        authors = list(User.objects.values_list('pk', flat=True))
+        Post.objects.bulk_create(
+            Post(author_id=random.choice(authors), text='пост')
+            for _ in range(POSTS)
+        )
+        posts = list(Post.objects.values_list('pk', flat=True))
+        Comment.objects.bulk_create(
+            (
+                Comment(post_id=random.choice(posts),
+                        author_id=random.choice(authors),
+                        text='текст')
+                for _ in range(rows)
+            ),
+            batch_size=500,
+        )
+
+    def _run(self, label, settings_dict, options):
+        stop = threading.Event()
+        # замер начинается, когда все потоки подключились
+        ready = threading.Barrier(
+            options['readers'] + options['writers'] + 1
+        )
+        lock = threading.Lock()
+        latencies = []
+        counters = {'writes': 0, 'lock_errors': 0}
+
+        def ids():
+            return (
+                list(Post.objects.values_list('pk', flat=True)),
+                list(User.objects.values_list('pk', flat=True)),
+            )
+
+        def read():
+            posts, _ = ids()
+            ready.wait()
+            local = []
+            attempt = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    # запрос комментариев страницы поста
+                    list(
+                        Comment.objects.filter(post_id=random.choice(posts))
+                        .order_by('created', 'id')[:settings.COMMENTS_PAGE]
+                    )
+                except OperationalError:
+                    with lock:
+                        counters['lock_errors'] += 1
+                    _backoff(attempt)
+                    attempt += 1
+                    continue
+                attempt = 0
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        def write():
+            posts, authors = ids()
+            ready.wait()
+            attempt = 0
+            while not stop.is_set():
+                try:
+                    # транзакция на запрос, как у add_comment
+                    with transaction.atomic():
+                        Comment.objects.create(
+                            post_id=random.choice(posts),
+                            author_id=random.choice(authors),
+                            text='новый комментарий',
+                        )
+                except OperationalError:
+                    with lock:
+                        counters['lock_errors'] += 1
+                    _backoff(attempt)
+                    attempt += 1
+                    continue
+                attempt = 0
+                with lock:
+                    counters['writes'] += 1
+
+        threads = (
+            [self._thread(settings_dict, read)
+             for _ in range(options['readers'])]
+            + [self._thread(settings_dict, write)
+               for _ in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        duration = options['duration']
+        return {
+            'label': label,
+            'reads_per_second': len(latencies) / duration,
+            'read_p50_ms': percentile(latencies, 0.50) * 1000,
+            'read_p95_ms': percentile(latencies, 0.95) * 1000,
+            'read_p99_ms': percentile(latencies, 0.99) * 1000,
+            'writes_per_second': counters['writes'] / duration,
+            'lock_errors': counters['lock_errors'],
+        }
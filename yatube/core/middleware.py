@@ -0,0 +1,84 @@
+"""Замер времени, SQL, шаблонов и кэша каждого (выбранного) запроса.
+
+Замеряется доля PERF_SAMPLE_RATE запросов: у остальных расход — один
+вызов random(). Итог добавляется в заголовок Server-Timing, который
+показывают инструменты разработчика браузера (описания в нём
+латиницей: заголовки передаются в latin-1), и в скользящую сводку
+core.perf.aggregate. Если один и тот же SQL повторился не меньше
+PERF_DUPLICATE_THRESHOLD раз, в лог пишется предупреждение: обычно
+это N+1.
+"""
+import contextlib
+import logging
+import random
+
+from django.conf import settings
+from django.db import connections
+
+from .perf import Recorder, aggregate, recording
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+def server_timing(recorder, total, view):
+    def metric(name, duration=None, description=None):
+        value = name
+        if duration is not None:
+            value += f';dur={duration * 1000:.1f}'
+        if description is not None:
+            value += f';desc="{description}"'
+        return value
+
+    return ', '.join((
+        metric('total', total, view),
+        metric('sql', recorder.sql_time,
+               f'{recorder.sql_count} queries / '
+               f'{recorder.duplicates} repeated'),
+        metric('tpl', recorder.template_time),
+        metric('cache', description=(
+            f'{recorder.cache_hits} hits / {recorder.cache_misses} misses'
+        )),
+    ))
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return self.get_response(request)
+        recorder = Recorder()
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(recording(recorder))
+            stack.enter_context(recorder.caches())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = recorder.elapsed
+        view = view_name(request)
+        aggregate.add(
+            view,
+            total=total,
+            sql_count=recorder.sql_count,
+            sql_time=recorder.sql_time,
+            template_time=recorder.template_time,
+            duplicates=recorder.duplicates,
+            cache_hits=recorder.cache_hits,
+            cache_misses=recorder.cache_misses,
+        )
+        statement, repeats = recorder.most_repeated()
+        if repeats >= settings.PERF_DUPLICATE_THRESHOLD:
+            logger.warning(
+                '%s: запрос выполнен %d раз за один ответ: %s',
+                view, repeats, statement,
+            )
+        response['Server-Timing'] = server_timing(recorder, total, view)
+        return response
@@ -0,0 +1,182 @@
+"""Замеры одного запроса и скользящая сводка по представлениям.
+
+Recorder копит время SQL-запросов (через execute_wrapper), отрисовки
+шаблонов (см. core.backends.templates) и попадания в кэш для текущего
+потока. Сводка хранит последние PERF_WINDOW замеров каждого
+представления в памяти процесса: её отдаёт страница /perf/ и читает
+PerformanceMiddleware.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+_local = threading.local()
+_missing = object()
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Recorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = collections.Counter()
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._in_get_many = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: параметры не учитываются, поэтому
+        # повторяющийся с разными id запрос и есть N+1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            self.statements[sql] += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторяют уже выполненный."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self):
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+    @contextlib.contextmanager
+    def template(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.template_time += time.perf_counter() - started
+
+    def _counted_get(self, get):
+        def wrapper(key, default=None, version=None):
+            value = get(key, _missing, version=version)
+            if self._in_get_many:
+                # get_many из BaseCache (locmem, файлы) зовёт get по
+                # ключу: такие обращения посчитает сам get_many
+                return default if value is _missing else value
+            if value is _missing:
+                self.cache_misses += 1
+                return default
+            self.cache_hits += 1
+            return value
+        return wrapper
+
+    def _counted_get_many(self, get_many):
+        def wrapper(keys, version=None):
+            keys = list(keys)
+            self._in_get_many = True
+            try:
+                found = get_many(keys, version=version)
+            finally:
+                self._in_get_many = False
+            self.cache_hits += len(found)
+            self.cache_misses += len(keys) - len(found)
+            return found
+        return wrapper
+
+    @contextlib.contextmanager
+    def caches(self):
+        """Считает попадания в кэши этого потока, пока открыт контекст.
+
+        Экземпляры кэшей у каждого потока свои, поэтому подмена их
+        методов не задевает соседние запросы.
+        """
+        patched = [caches[alias] for alias in settings.CACHES]
+        for cache in patched:
+            cache.get = self._counted_get(cache.get)
+            cache.get_many = self._counted_get_many(cache.get_many)
+        try:
+            yield
+        finally:
+            for cache in patched:
+                del cache.get
+                del cache.get_many
+
+
+def current():
+    """Recorder запроса, который сейчас замеряется в этом потоке."""
+    return getattr(_local, 'recorder', None)
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = None
+
+
+class Aggregate:
+    """Последние замеры каждого представления."""
+
+    FIELDS = ('total', 'sql_count', 'sql_time', 'template_time',
+              'duplicates', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, view, **sample):
+        with self.lock:
+            window = self.samples.get(view)
+            if window is None:
+                window = self.samples[view] = collections.deque(
+                    maxlen=settings.PERF_WINDOW
+                )
+            window.append(tuple(sample[field] for field in self.FIELDS))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self.lock:
+            samples = {
+                view: list(window) for view, window in self.samples.items()
+            }
+        result = {}
+        for view, rows in samples.items():
+            columns = dict(zip(self.FIELDS, zip(*rows)))
+            totals = columns['total']
+            hits = sum(columns['cache_hits'])
+            lookups = hits + sum(columns['cache_misses'])
+            result[view] = {
+                'requests': len(rows),
+                'p50_ms': percentile(totals, 0.50) * 1000,
+                'p95_ms': percentile(totals, 0.95) * 1000,
+                'p99_ms': percentile(totals, 0.99) * 1000,
+                'sql_queries': sum(columns['sql_count']) / len(rows),
+                'sql_ms': sum(columns['sql_time']) / len(rows) * 1000,
+                'template_ms': (
+                    sum(columns['template_time']) / len(rows) * 1000
+                ),
+                'duplicates': sum(columns['duplicates']) / len(rows),
+                'cache_hit_ratio': hits / lookups if lookups else None,
+            }
+        return result
+
+
+aggregate = Aggregate()
@@ -0,0 +1,160 @@
+"""Раздача собранной статики из STATIC_ROOT прямо в WSGI.
+
+StaticFilesApplication оборачивает приложение Django (см.
+yatube/wsgi.py) и отвечает на GET и HEAD под STATIC_URL, не доходя до
+middleware и маршрутов. Список файлов и их размеров читается с диска
+один раз, при первом обращении: после collectstatic процесс всё равно
+перезапускают. Файлы с отпечатком из манифеста неизменны, поэтому
+отдаются с Cache-Control на STATIC_MAX_AGE и immutable; остальные
+браузер перепроверяет по ETag. Если клиент принимает br или gzip и
+рядом лежит сжатая при сборке копия (см. core.storage), отдаётся она.
+Всё, чего нет в сборке, уходит дальше в Django.
+"""
+import json
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+from django.utils.http import http_date
+
+# от лучшего сжатия к худшему
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+MANIFEST = 'staticfiles.json'
+CHUNK_SIZE = 64 * 1024
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    result = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            result.add(coding)
+    return result
+
+
+class Asset:
+    """Файл сборки и его сжатые копии: {кодировка: (путь, размер)}."""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.variants = {None: (path, stat.st_size)}
+        for coding, extension in ENCODINGS:
+            if os.path.exists(path + extension):
+                size = os.path.getsize(path + extension)
+                self.variants[coding] = (path + extension, size)
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith(
+                ('javascript', 'json', 'xml')):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+        if immutable:
+            self.cache_control = (
+                f'public, max-age={settings.STATIC_MAX_AGE}, immutable'
+            )
+        else:
+            self.cache_control = 'public, no-cache'
+
+    def pick(self, accepted):
+        for coding, _ in ENCODINGS:
+            if coding in self.variants and coding in accepted:
+                return coding
+        return None
+
+    def headers(self, coding):
+        path, size = self.variants[coding]
+        etag = f'"{self.etag}-{coding}"' if coding else f'"{self.etag}"'
+        headers = [
+            ('Content-Type', self.content_type),
+            ('Cache-Control', self.cache_control),
+            ('Last-Modified', self.last_modified),
+            ('ETag', etag),
+        ]
+        if len(self.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if coding:
+            headers.append(('Content-Encoding', coding))
+        return path, size, etag, headers
+
+
+class StaticFilesApplication:
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root
+        self.prefix = prefix
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def assets(self):
+        with self._lock:
+            if self._assets is None:
+                self._assets = self._scan(self.root or settings.STATIC_ROOT)
+        return self._assets
+
+    def _scan(self, root):
+        assets = {}
+        if not root or not os.path.isdir(root):
+            return assets
+        try:
+            with open(os.path.join(root, MANIFEST), encoding='utf-8') as file:
+                hashed = set(json.load(file).get('paths', {}).values())
+        except (OSError, ValueError):
+            hashed = set()
+        suffixes = tuple(extension for _, extension in ENCODINGS)
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                if filename.endswith(suffixes) or filename == MANIFEST:
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                assets[name] = Asset(path, name in hashed)
+        return assets
+
+    def __call__(self, environ, start_response):
+        prefix = self.prefix or settings.STATIC_URL
+        path = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD')
+        if method not in ('GET', 'HEAD') or not path.startswith(prefix):
+            return self.application(environ, start_response)
+        asset = self.assets().get(path[len(prefix):])
+        if asset is None:
+            return self.application(environ, start_response)
+
+        coding = asset.pick(
+            accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        )
+        path, size, etag, headers = asset.headers(coding)
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(file, CHUNK_SIZE)
+        return _chunks(file)
+
+
+def _chunks(file):
+    with file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
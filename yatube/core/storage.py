@@ -0,0 +1,82 @@
+"""Хранилище статики с отпечатками и заранее сжатыми копиями.
+
+``manage.py collectstatic`` копирует yatube/static в STATIC_ROOT, рядом
+с каждым файлом кладёт копию с хэшем содержимого в имени
+(css/bootstrap.min.<хэш>.css) и пишет манифест staticfiles.json. Для
+текстовых файлов дополнительно создаются соседи .gz и, если установлен
+пакет brotli, .br: сжатие с максимальным уровнем выполняется один раз
+при сборке, а не на каждый ответ. Раздаёт их core.static.
+
+Манифест читается один раз при создании хранилища, а готовые адреса
+{% static %} запоминаются в словаре процесса.
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# картинки и шрифты уже сжаты
+COMPRESSIBLE = (
+    '.css', '.js', '.map', '.svg', '.ico', '.json', '.txt', '.xml', '.html',
+)
+
+
+def compressors():
+    """Пары (расширение, функция сжатия), доступные в этой установке."""
+    result = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        result.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return result
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic ещё не запускали или файла нет в сборке:
+            # ссылка без отпечатка лучше, чем ошибка 500 на каждой странице
+            return name
+
+    def url(self, name, force=False):
+        if settings.DEBUG and not force:
+            return super().url(name, force)
+        url = self._urls.get(name)
+        if url is None:
+            url = self._urls[name] = super().url(name, force)
+        return url
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        self._urls.clear()
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.lower().endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        """Пишет сжатые копии файла, если они меньше исходного."""
+        with self.open(name) as source:
+            data = source.read()
+        path = self.path(name)
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                with open(path + extension, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(path + extension):
+                # копия от прошлой сборки больше не соответствует файлу
+                os.remove(path + extension)
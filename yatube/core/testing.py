@@ -0,0 +1,21 @@
+"""Помощники для тестов."""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет колбэки transaction.on_commit, добавленные в блоке.
+
+    TestCase держит каждый тест в транзакции, которая не фиксируется, и
+    без этого колбэки в тестах не выполняются вовсе. Аналог
+    captureOnCommitCallbacks(execute=True) из Django 3.2.
+    """
+    start = len(connections[using].run_on_commit)
+    try:
+        yield
+    finally:
+        callbacks = connections[using].run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
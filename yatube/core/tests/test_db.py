@@ -0,0 +1,33 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+
+class SQLiteTuningTest(TestCase):
+    """Подключение к SQLite получает PRAGMA-настройки для продакшена."""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        # in-memory база тестов не поддерживает WAL и mmap, поэтому
+        # проверяются настройки, не зависящие от файла
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_benchmark_reports_both_configurations(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite', duration=0.2, rows=100, json=True, stdout=out
+        )
+        results = {row['label']: row for row in json.loads(out.getvalue())}
+        self.assertEqual(set(results), {'default', 'tuned'})
+        self.assertGreater(results['tuned']['reads_per_second'], 0)
+        self.assertGreater(results['tuned']['writes_per_second'], 0)
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..middleware import PerformanceMiddleware
+from ..perf import Recorder, aggregate
+
+User = get_user_model()
+
+
+def repeated_queries(request):
+    # N+1: один и тот же запрос с разными параметрами
+    for pk in range(6):
+        User.objects.filter(pk=pk).exists()
+    return HttpResponse()
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0)
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        aggregate.clear()
+
+    def timing(self, response):
+        metrics = response['Server-Timing'].split(', ')
+        return dict(metric.split(';', 1) for metric in metrics)
+
+    def test_server_timing_header(self):
+        """Ответ сообщает время целиком, SQL, шаблонов и кэша."""
+        response = Client().get(reverse('posts:main'))
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'total', 'sql', 'tpl', 'cache'})
+        self.assertIn('desc="posts:main"', timing['total'])
+        self.assertIn('queries', timing['sql'])
+        self.assertNotIn('dur=0.0', timing['tpl'])
+        self.assertIn('misses', timing['cache'])
+
+    def test_rolling_aggregate(self):
+        client = Client()
+        for _ in range(3):
+            client.get(reverse('posts:main'))
+        summary = aggregate.summary()['posts:main']
+        self.assertEqual(summary['requests'], 3)
+        # повторы отдаются из кэша страниц
+        self.assertGreater(summary['cache_hit_ratio'], 0)
+        self.assertGreaterEqual(summary['p99_ms'], summary['p50_ms'])
+
+    def test_repeated_queries_are_reported(self):
+        middleware = PerformanceMiddleware(repeated_queries)
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn('5 repeated', response['Server-Timing'])
+        self.assertIn('6 раз', logs.output[0])
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_request_is_not_measured(self):
+        response = Client().get(reverse('posts:main'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(aggregate.summary(), {})
+
+    def test_summary_page_for_staff_only(self):
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        self.assertEqual(client.get(reverse('perf')).status_code, 302)
+        client.force_login(staff)
+        client.get(reverse('posts:main'))
+        response = client.get(reverse('perf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:main', response.json())
+
+
+class RecorderCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_hits_and_misses(self):
+        """get_many, который зовёт get, считает каждый ключ один раз."""
+        cache.set_many({'a': 1, 'b': 2})
+        recorder = Recorder()
+        with recorder.caches():
+            self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+            self.assertEqual(cache.get('a'), 1)
+            self.assertIsNone(cache.get('c'))
+        self.assertEqual(recorder.cache_hits, 3)
+        self.assertEqual(recorder.cache_misses, 2)
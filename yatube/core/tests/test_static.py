@@ -0,0 +1,136 @@
+import gzip
+import os
+import shutil
+import tempfile
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..static import StaticFilesApplication, accepted_encodings
+from ..storage import brotli
+
+STATIC_ROOT = tempfile.mkdtemp()
+
+
+def django_application(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain')])
+    return [b'django']
+
+
+@override_settings(STATIC_ROOT=STATIC_ROOT)
+class StaticBuildTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.application = StaticFilesApplication(django_application)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def request(self, path, **environ):
+        setup_testing_defaults(environ)
+        environ['PATH_INFO'] = path
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = b''.join(self.application(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_fingerprinted_url(self):
+        """{% static %} ведёт на копию с хэшем содержимого в имени."""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertRegex(
+            url, r'^/static/css/bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        cache.clear()
+        response = Client().get(reverse('posts:main'))
+        self.assertContains(response, url)
+
+    def test_missing_file_keeps_plain_url(self):
+        """Файл вне сборки не ломает страницу."""
+        self.assertEqual(
+            staticfiles_storage.url('img/fav/missing.png'),
+            '/static/img/fav/missing.png',
+        )
+
+    def test_precompressed_siblings(self):
+        """Сжатые копии есть у текстовых файлов, у картинок — нет."""
+        name = staticfiles_storage.stored_name('css/bootstrap.min.css')
+        path = staticfiles_storage.path(name)
+        with open(path, 'rb') as original, open(path + '.gz', 'rb') as packed:
+            self.assertEqual(gzip.decompress(packed.read()), original.read())
+        logo = staticfiles_storage.path(
+            staticfiles_storage.stored_name('img/logo.png')
+        )
+        self.assertFalse(os.path.exists(logo + '.gz'))
+        self.assertEqual(os.path.exists(path + '.br'), brotli is not None)
+
+    def test_serves_hashed_file_for_a_year(self):
+        """Файл с отпечатком кэшируется надолго, сжатая копия по запросу."""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        status, headers, body = self.request(
+            url, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(
+            headers['Cache-Control'], 'public, max-age=31536000, immutable'
+        )
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        with staticfiles_storage.open('css/bootstrap.min.css') as original:
+            self.assertEqual(gzip.decompress(body), original.read())
+
+    def test_identity_and_plain_names(self):
+        """Без Accept-Encoding отдаётся исходный файл; имя без отпечатка
+        браузер перепроверяет."""
+        status, headers, body = self.request('/static/css/bootstrap.min.css')
+        self.assertEqual(status, '200 OK')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(headers['Cache-Control'], 'public, no-cache')
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+        status, headers, _ = self.request(
+            '/static/css/bootstrap.min.css',
+            HTTP_ACCEPT_ENCODING='gzip;q=0',
+        )
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304 без тела."""
+        _, headers, _ = self.request('/static/js/comments.js')
+        status, _, body = self.request(
+            '/static/js/comments.js', HTTP_IF_NONE_MATCH=headers['ETag']
+        )
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+
+    def test_passes_other_requests_to_django(self):
+        """Чужие пути, файлы вне сборки и POST обрабатывает Django."""
+        for path, method in (
+            ('/', 'GET'),
+            ('/static/../manage.py', 'GET'),
+            ('/static/staticfiles.json', 'GET'),
+            ('/static/css/bootstrap.min.css', 'POST'),
+        ):
+            with self.subTest(path=path, method=method):
+                _, _, body = self.request(path, REQUEST_METHOD=method)
+                self.assertEqual(body, b'django')
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            accepted_encodings('gzip, deflate, br;q=0, *;q=0.1'),
+            {'gzip', 'deflate', '*'},
+        )
+        self.assertEqual(accepted_encodings(''), set())
@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .perf import aggregate
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,11 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, "core/500.html", status=500)
+
+
+@staff_member_required
+def perf(request):
+    """Скользящая сводка замеров этого процесса, см. core.middleware."""
+    return JsonResponse(
+        aggregate.summary(), json_dumps_params={'ensure_ascii': False}
+    )
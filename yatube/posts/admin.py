@@ -1,9 +1,74 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Max, Min
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
-from .models import Comment, Follow, Group, Post
+from . import moderation, search
+from .models import Comment, Follow, Group, ModerationJob, Post
+from .utils import cached_count
 
 
-class PostAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор списков админки без COUNT(*) по большим таблицам.
+
+    Без фильтров число строк оценивается по диапазону первичного ключа:
+    MIN и MAX берутся из индекса, а удалённые строки лишь немного
+    завышают оценку. С фильтром COUNT(*) выполняется, но запоминается в
+    кэше, как и у лент на сайте.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return cached_count(queryset)
+        bounds = queryset.model._default_manager.aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        if bounds['first'] is None:
+            return 0
+        return bounds['last'] - bounds['first'] + 1
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # иначе на каждой странице считается COUNT(*) всей таблицы
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class ModerationAdmin(ScalableAdmin):
+    """Админка с массовыми действиями, которые идут в фоне."""
+
+    def start_job(self, request, kind, targets, group=None):
+        job = moderation.start(kind, targets, user=request.user, group=group)
+        self.message_user(request, format_html(
+            'Задание <a href="{}">{}</a> запущено: {} объектов.',
+            reverse('admin:posts_moderationjob_change', args=[job.pk]),
+            job,
+            job.total,
+        ))
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа'
+    )
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class PostAdmin(ModerationAdmin):
     list_display = (
         'pk',
         'text',
@@ -13,12 +78,126 @@ class PostAdmin(admin.ModelAdmin):
     )
 
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    # по индексу post_date_idx
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author',)
+    action_form = PostActionForm
+    actions = ('delete_in_background', 'move_to_group')
+
+    def get_actions(self, request):
+        # стандартное удаление грузит каждый пост со всеми комментариями
+        # прямо в запросе; вместо него удаление в фоне
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_in_background(self, request, queryset):
+        self.start_job(
+            request,
+            ModerationJob.DELETE_POSTS,
+            queryset.values_list('pk', flat=True),
+        )
+    delete_in_background.short_description = 'Удалить выбранные посты'
+
+    def move_to_group(self, request, queryset):
+        # у формы действий выбор action заполняется на лету, поэтому
+        # проверяется только поле группы
+        try:
+            group = PostActionForm.base_fields['group'].clean(
+                request.POST.get('group')
+            )
+        except ValidationError:
+            group = None
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу для переноса.', messages.ERROR
+            )
+            return
+        self.start_job(
+            request,
+            ModerationJob.MOVE_POSTS,
+            queryset.values_list('pk', flat=True),
+            group=group,
+        )
+    move_to_group.short_description = 'Перенести выбранные посты в группу'
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group' and field is not None:
+            # list_editable строит форму на каждую строку списка; без
+            # этого каждая заново выбирает все группы для выпадающего списка
+            choices = getattr(request, '_group_choices', None)
+            if choices is None:
+                # iter(): list() спросил бы сначала len(), то есть COUNT(*)
+                choices = request._group_choices = list(iter(field.choices))
+            field.choices = choices
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE '%...%' по тексту просматривает всю таблицу, поэтому
+        # поиск идёт по полнотекстовому индексу постов
+        if (not search.available()
+                or not search.match_expression(search_term)):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        sql, params = search.post_ids_sql(search_term, comments=False)
+        return queryset.filter(pk__in=RawSQL(sql, params)), False
+
+
+class CommentAdmin(ModerationAdmin):
+    list_display = ('pk', 'text', 'post', 'author', 'created')
+    list_select_related = ('post', 'author')
+    # точное совпадение ищется по уникальному индексу username
+    search_fields = ('=author__username',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
+    actions = ('purge_authors_comments',)
+
+    def purge_authors_comments(self, request, queryset):
+        self.start_job(
+            request,
+            ModerationJob.PURGE_COMMENTS,
+            queryset.values_list('author_id', flat=True).distinct(),
+        )
+    purge_authors_comments.short_description = (
+        'Удалить все комментарии авторов выбранных комментариев'
+    )
+
+
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    autocomplete_fields = ('user', 'author')
+
+
+class ModerationJobAdmin(admin.ModelAdmin):
+    list_display = (
+        '__str__', 'status', 'progress', 'created_by', 'created', 'finished'
+    )
+    list_select_related = ('created_by',)
+    list_filter = ('kind', 'status')
+    # список целей бывает длиной в тысячи id
+    exclude = ('targets',)
+
+    def progress(self, job):
+        percent = job.done * 100 // job.total if job.total else 100
+        return f'{job.done} из {job.total} ({percent}%)'
+    progress.short_description = 'Прогресс'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Follow)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(ModerationJob, ModerationJobAdmin)
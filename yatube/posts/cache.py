@@ -0,0 +1,284 @@
+"""Кэш карточек постов и целых страниц для анонимных посетителей.
+
+Фрагмент карточки хранится под ключом из id поста и его версии. Версии
+всех постов страницы читаются одним get_many, а сигналы моделей меняют
+версию при любом изменении, поэтому правки видны сразу, хотя сами
+фрагменты живут долго.
+
+Страница для анонимного посетителя сохраняется вместе со снимком
+поколений областей, от которых она зависит (вся лента, группа, автор,
+пост). Запись увеличивает поколение области, и все её страницы
+перестают совпадать со снимком за O(1), не дожидаясь истечения TTL.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, set_response_etag)
+from django.utils.http import http_date, parse_http_date_safe
+
+CARD_VERSION_KEY = 'post_card_version:{}'
+GENERATION_KEY = 'page_generation:{}'
+PAGE_KEY = 'anonymous_page:{}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _new_generation():
+    # время смены поколения отдаётся клиентам в заголовке Last-Modified
+    return f'{int(time.time())}:{_new_version()}'
+
+
+def attach_card_versions(page_obj):
+    keys = {CARD_VERSION_KEY.format(post.pk): post for post in page_obj}
+    versions = cache.get_many(keys)
+    missing = {
+        key: _new_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    for key, post in keys.items():
+        post.card_version = versions[key]
+    page_obj.card_timeout = settings.POST_CARD_CACHE_TIMEOUT
+    return page_obj
+
+
+def invalidate_cards(post_ids):
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), 500):
+        cache.set_many(
+            {
+                CARD_VERSION_KEY.format(pk): _new_version()
+                for pk in post_ids[start:start + 500]
+            },
+            None,
+        )
+
+
+def _generations(scopes):
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump(*scopes):
+    """Сбрасывает все закэшированные страницы перечисленных областей."""
+    cache.set_many(
+        {GENERATION_KEY.format(scope): _new_generation()
+         for scope in scopes},
+        None,
+    )
+
+
+class _Pending:
+    """Карточки и области, которые сбросит фиксация транзакции."""
+
+    def __init__(self, using):
+        self.using = using
+        self.post_ids = set()
+        self.scopes = set()
+        self.scope_posts = set()
+        self.done = False
+
+    def update(self, post_ids, scopes, scope_posts):
+        self.post_ids.update(post_ids)
+        self.scopes.update(scopes)
+        self.scope_posts.update(scope_posts)
+
+    def __call__(self):
+        from .models import Post
+
+        self.done = True
+        if self.scope_posts:
+            # удалённые посты не найдутся: их области добавил post_delete
+            posts = (Post.objects.using(self.using)
+                     .filter(pk__in=self.scope_posts).only('author', 'group'))
+            for post in posts:
+                self.scopes.update(post_scopes(post))
+        invalidate_cards(self.post_ids)
+        if self.scopes:
+            bump(*self.scopes)
+
+
+def invalidate_on_commit(post_ids=(), scopes=(), using=None,
+                         scope_posts=()):
+    """Сбрасывает карточки и поколения после фиксации транзакции.
+
+    Пока транзакция не зафиксирована, запрос из другого соединения ещё
+    видит старые строки; сброс до фиксации дал бы ему сохранить их под
+    новой версией, и устаревшая запись осталась бы в кэше. Подряд идущие
+    вызовы в одной точке сохранения (например, каскадное удаление)
+    собираются вместе и сбрасывают кэш один раз. Области постов из
+    scope_posts находятся при фиксации одним запросом. Вне транзакции
+    сброс выполняется сразу.
+    """
+    connection = transaction.get_connection(using)
+    if connection.run_on_commit:
+        savepoints, pending = connection.run_on_commit[-1]
+        if (isinstance(pending, _Pending) and not pending.done
+                and savepoints == set(connection.savepoint_ids)):
+            pending.update(post_ids, scopes, scope_posts)
+            return
+    pending = _Pending(connection.alias)
+    pending.update(post_ids, scopes, scope_posts)
+    transaction.on_commit(pending, using=using)
+
+
+def post_scopes(post, *group_ids):
+    scopes = {'posts', f'post:{post.pk}', f'author:{post.author_id}'}
+    for group_id in (post.group_id, *group_ids):
+        if group_id is not None:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+def scope_validators(scopes, *parts):
+    """ETag и Last-Modified по поколениям областей, без запросов к базе.
+
+    parts добавляются к ETag: адрес страницы, пользователь и т. п.
+    """
+    generations = _generations(scopes)
+    etag = hashlib.md5(
+        repr((sorted(generations.items()), parts)).encode()
+    ).hexdigest()
+    changed = [
+        int(value.split(':', 1)[0]) for value in generations.values()
+        if ':' in value
+    ]
+    return f'"{etag}"', max(changed, default=None)
+
+
+def depends_on(request, *scopes):
+    """Отмечает, от каких областей зависит отрисовываемая страница.
+
+    Вызывается до чтения данных, чтобы запись, случившаяся во время
+    отрисовки, не попала в кэш под новым поколением.
+    """
+    stamp = getattr(request, '_page_cache_stamp', None)
+    if stamp is not None:
+        stamp.update(_generations(scopes))
+
+
+def _conditional(request, response):
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(
+            response.get('Last-Modified', '')
+        ),
+        response=response,
+    )
+
+
+def conditional_page(validators):
+    """Отвечает 304, если страница не менялась с прошлого визита.
+
+    validators(request, *args, **kwargs) возвращает (области, время
+    последнего изменения) или None, если объекта нет. ETag строится по
+    поколениям областей, а Last-Modified — по позднему из времени
+    изменения и времени смены поколения, поэтому оба учитывают и
+    удаления, которых не видно по датам; проверка стоит один-два
+    запроса вместо отрисовки шаблона.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            state = None
+            if request.method in ('GET', 'HEAD'):
+                state = validators(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            scopes, modified = state
+            if request.user.is_authenticated:
+                # отложенные записи пользователя (см. posts.writebehind)
+                scopes = (*scopes, f'user:{request.user.pk}')
+            etag, changed = scope_validators(
+                scopes,
+                request.get_full_path(),
+                request.user.pk,
+                # в формах страницы есть CSRF-токен
+                request.META.get('CSRF_COOKIE'),
+            )
+            # удаления и подписки не двигают даты постов, но меняют
+            # поколение; время его смены тоже учитывается
+            stamps = [changed]
+            if modified is not None:
+                stamps.append(int(modified.timestamp()))
+            last_modified = max(
+                (stamp for stamp in stamps if stamp is not None),
+                default=None,
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(response, max_age=0)
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def anonymous_cache_page(view):
+    """Кэширует страницу целиком для анонимных GET-запросов.
+
+    Авторизованные пользователи видят переключатель лент и кнопки
+    подписки, поэтому их запросы идут мимо кэша.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        key = PAGE_KEY.format(
+            hashlib.md5(request.get_full_path().encode()).hexdigest()
+        )
+        entry = cache.get(key)
+        if entry is not None:
+            stamp, response = entry
+            if _generations(stamp) == stamp:
+                return _conditional(request, response)
+
+        request._page_cache_stamp = {}
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Cookie',))
+        if response.status_code != 200 or response.streaming:
+            return response
+        if not response.has_header('ETag'):
+            set_response_etag(response)
+        patch_cache_control(response, max_age=0)
+        if not response.cookies:
+            cache.set(
+                key,
+                (request._page_cache_stamp, response),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        return _conditional(request, response)
+
+    return wrapper
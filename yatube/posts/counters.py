@@ -0,0 +1,109 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET n = n + 1, поэтому
+одновременные записи не теряют приращений. Обновления идут в
+транзакции вызывающего кода (см. AtomicSaveModel): откат записи
+откатывает и счётчик. Полный пересчёт выполняет
+команда ``manage.py recount_counters``.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _change(queryset, field, delta, **values):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta}, **values)
+
+
+def change_user(user_id, field, delta):
+    with transaction.atomic(savepoint=False):
+        updated = _change(
+            UserStats.objects.filter(user_id=user_id), field, delta
+        )
+        if not updated and delta > 0:
+            _, created = UserStats.objects.get_or_create(
+                user_id=user_id, defaults={field: delta}
+            )
+            if not created:
+                _change(
+                    UserStats.objects.filter(user_id=user_id), field, delta
+                )
+
+
+def change_comments(post_id, delta):
+    # комментарии выводятся на странице поста, поэтому пост изменился
+    with transaction.atomic(savepoint=False):
+        _change(
+            Post.objects.filter(pk=post_id), 'comments_count', delta,
+            last_modified=timezone.now(),
+        )
+
+
+def stats_for(user):
+    """Счётчики пользователя; select_related('stats') избавляет от запроса."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def recount(chunk_size=1000):
+    """Пересчитывает все счётчики пачками, возвращает число пользователей."""
+    Post.objects.update(comments_count=_count(Comment, 'post'))
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    processed = 0
+    last_pk = 0
+    while True:
+        chunk = list(users.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1]
+        rows = (
+            User.objects.filter(pk__in=chunk)
+            .annotate(
+                posts_total=_count(Post, 'author'),
+                followers_total=_count(Follow, 'author'),
+                following_total=_count(Follow, 'user'),
+            )
+            .values_list(
+                'pk', 'posts_total', 'followers_total', 'following_total'
+            )
+        )
+        # отметку ленты сверяет с новыми счётчиками feed.sync_direct_feeds
+        direct = set(
+            UserStats.objects.filter(user_id__in=chunk, direct_feed=True)
+            .values_list('user_id', flat=True)
+        )
+        stats = [
+            UserStats(
+                user_id=pk,
+                posts_count=posts,
+                followers_count=followers,
+                following_count=following,
+                direct_feed=pk in direct,
+            )
+            for pk, posts, followers, following in rows
+        ]
+        with transaction.atomic():
+            UserStats.objects.filter(user_id__in=chunk).delete()
+            UserStats.objects.bulk_create(stats)
+        processed += len(stats)
+    return processed
@@ -0,0 +1,103 @@
+"""Адаптивные копии картинок постов для <picture> и srcset.
+
+Для каждой загруженной картинки готовятся копии нескольких ширин в
+JPEG, WebP и, если локальный Pillow умеет, AVIF. Имена строятся из
+SHA-1 содержимого файла, поэтому повторная генерация ничего не
+перезаписывает, а одинаковые картинки разных постов делят копии.
+"""
+import functools
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+FORMATS = (
+    # (формат Pillow, расширение, MIME-тип), от лучшего сжатия к худшему
+    ('AVIF', 'avif', 'image/avif'),
+    ('WEBP', 'webp', 'image/webp'),
+    ('JPEG', 'jpg', 'image/jpeg'),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def supported_formats():
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return tuple(
+        (name, extension) for name, extension, _ in FORMATS
+        if name in Image.SAVE
+    )
+
+
+def _size(width):
+    geometry_width, geometry_height = (
+        int(side) for side in settings.POST_THUMBNAIL_GEOMETRY.split('x')
+    )
+    return width, round(width * geometry_height / geometry_width)
+
+
+def derivative_name(digest, width, extension):
+    return f'derivatives/{digest[:2]}/{digest}/{width}.{extension}'
+
+
+def generate_derivatives(name):
+    """Создаёт копии картинки и возвращает (digest, 'jpg,webp,...')."""
+    with default_storage.open(name) as source:
+        data = source.read()
+    digest = hashlib.sha1(data).hexdigest()
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    image = image.convert('RGB')
+    formats = supported_formats()
+    for width in settings.POST_IMAGE_WIDTHS:
+        resized = ImageOps.fit(image, _size(width), Image.LANCZOS)
+        for pillow_format, extension in formats:
+            target = derivative_name(digest, width, extension)
+            if default_storage.exists(target):
+                continue
+            buffer = BytesIO()
+            resized.save(
+                buffer,
+                pillow_format,
+                quality=settings.POST_IMAGE_QUALITY,
+                optimize=pillow_format == 'JPEG',
+            )
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    return digest, ','.join(extension for _, extension in formats)
+
+
+def fallback_url(post):
+    """JPEG-копия ширины основной миниатюры для <img> внутри <picture>."""
+    width = int(settings.POST_THUMBNAIL_GEOMETRY.split('x')[0])
+    if width not in settings.POST_IMAGE_WIDTHS:
+        width = settings.POST_IMAGE_WIDTHS[-1]
+    return default_storage.url(
+        derivative_name(post.image_digest, width, 'jpg')
+    )
+
+
+def picture_sources(post):
+    """Источники для <picture>: MIME-тип и srcset для каждого формата."""
+    if not post.image_digest:
+        return []
+    available = post.image_formats.split(',')
+    sources = []
+    for _, extension, mime in FORMATS:
+        if extension not in available:
+            continue
+        srcset = ', '.join(
+            '%s %dw' % (
+                default_storage.url(
+                    derivative_name(post.image_digest, width, extension)
+                ),
+                width,
+            )
+            for width in settings.POST_IMAGE_WIDTHS
+        )
+        sources.append({'type': mime, 'srcset': srcset})
+    return sources
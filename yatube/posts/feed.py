@@ -0,0 +1,209 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+Новый пост раскладывается в FeedEntry каждого подписчика автора, поэтому
+чтение ленты не требует соединения Follow и Post. Посты авторов, у
+которых больше FEED_FANOUT_LIMIT подписчиков, не раскладываются, а
+подмешиваются в ленту при чтении (fan-out-on-read).
+
+Такие авторы отмечены UserStats.direct_feed. Раскладка сверяется с
+отметкой в базе, чтение — с её копией в кэше. Когда подписчиков
+становится меньше порога, отметка снимается и посты автора разом
+раскладываются по лентам всех подписчиков: иначе посты, вышедшие, пока
+автор был популярным, пропали бы из лент.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from core.cache import get_or_compute
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+CELEBRITIES_KEY = 'feed_celebrities'
+FEED_ORDERING = ('-feed_date', '-feed_post')
+
+
+def _bulk_insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def celebrity_ids():
+    """Авторы, посты которых читаются напрямую, а не из FeedEntry."""
+
+    def compute():
+        return frozenset(
+            UserStats.objects.filter(direct_feed=True)
+            .values_list('user_id', flat=True)
+        )
+
+    return get_or_compute(
+        CELEBRITIES_KEY, compute, settings.FEED_CELEBRITIES_TIMEOUT
+    )
+
+
+def _is_direct(author_id):
+    # не кэш: пост, пропущенный по устаревшей копии, не попал бы в ленты
+    return UserStats.objects.filter(
+        user_id=author_id, direct_feed=True
+    ).exists()
+
+
+def _fan_out_author(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {FeedEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'WHERE f.author_id = %s',
+            [author_id],
+        )
+
+
+def update_direct_feed(author_id):
+    """Включает или снимает чтение напрямую по числу подписчиков."""
+    stats = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list('followers_count', 'direct_feed').first()
+    )
+    if stats is None:
+        return
+    followers, direct = stats
+    popular = followers >= settings.FEED_FANOUT_LIMIT
+    if popular == direct:
+        return
+    with transaction.atomic():
+        # отметка снимается до раскладки: пост, созданный после неё,
+        # разложит уже fan_out
+        UserStats.objects.filter(user_id=author_id).update(
+            direct_feed=popular
+        )
+        if not popular:
+            _fan_out_author(author_id)
+    cache.delete(CELEBRITIES_KEY)
+
+
+def sync_direct_feeds():
+    """Сверяет отметки всех авторов со счётчиками подписчиков.
+
+    Нужна, когда счётчики пересчитаны в обход сигналов или изменился
+    FEED_FANOUT_LIMIT.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    changed = UserStats.objects.filter(
+        Q(direct_feed=False, followers_count__gte=limit)
+        | Q(direct_feed=True, followers_count__lt=limit)
+    ).values_list('user_id', flat=True)
+    for author_id in list(changed):
+        update_direct_feed(author_id)
+
+
+def fan_out(post):
+    if _is_direct(post.author_id):
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    batch = []
+    for user_id in follower_ids.iterator():
+        batch.append(FeedEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        ))
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def backfill(user_id, author_id):
+    if _is_direct(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('pk', 'pub_date')
+    )
+    batch = []
+    for post_id, pub_date in posts.iterator():
+        batch.append(FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        ))
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def rebuild(chunk_size=2000):
+    """Раскладывает посты по лентам всех подписок, пачками по Follow.
+
+    Нужна после загрузки данных в обход сигналов; уже существующие
+    записи ленты пропускаются.
+    """
+    sync_direct_feeds()
+    celebrities = sorted(celebrity_ids()) or [0]
+    sql = (
+        f'INSERT OR IGNORE INTO {FeedEntry._meta.db_table} '
+        f'(user_id, post_id, author_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE f.id > %s AND f.id <= %s AND f.author_id NOT IN '
+        f'({", ".join(["%s"] * len(celebrities))})'
+    )
+    follows = Follow.objects.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        chunk = list(follows.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [last_pk, chunk[-1], *celebrities])
+        last_pk = chunk[-1]
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_for(user):
+    """Посты ленты подписок пользователя.
+
+    Сортировать ленту нужно по FEED_ORDERING: без популярных авторов
+    она читается прямо по индексу FeedEntry (user, -pub_date, -post).
+    """
+    celebrities = celebrity_ids()
+    direct = []
+    if celebrities:
+        direct = list(
+            Follow.objects.filter(user=user, author_id__in=celebrities)
+            .values_list('author_id', flat=True)
+        )
+    if not direct:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post_id'),
+        )
+    condition = (
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=direct)
+    )
+    return Post.objects.filter(condition).annotate(
+        feed_date=F('pub_date'),
+        feed_post=F('id'),
+    )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.writebehind import write_queue
+
+
+class Command(BaseCommand):
+    help = 'Применяет отложенные комментарии и подписки из очереди.'
+
+    def handle(self, *args, **options):
+        applied = write_queue.drain()
+        self.stdout.write(self.style.SUCCESS(
+            f'Применено отложенных действий: {applied}.'
+        ))
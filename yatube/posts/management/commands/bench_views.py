@@ -0,0 +1,207 @@
+import importlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from core.perf import percentile
+from posts.models import Comment, Follow, Group, Post, User
+
+APPS = ('posts', 'users', 'about')
+# страницы, которые меняют данные или сессию; замеряются с --writes
+WRITES = {
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'users:logout',
+}
+POSTS = {'posts:add_comment'}
+# страницы, которые без параметров запроса ничего не делают
+QUERIES = {'posts:search': {'q': 'кот'}}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50/p95/p99), число SQL-запросов и '
+            'пропускную способность всех страниц posts, users и about '
+            'для анонимного и вошедшего пользователя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Сколько запросов к каждой странице.',
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--user',
+            help='От чьего имени ходить; по умолчанию — читатель с '
+                 'наибольшим числом подписок.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--writes', action='store_true',
+            help='Замерять и страницы, меняющие данные.',
+        )
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='Замерять только эти страницы, например posts:main.',
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести результат в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        user = self._user(options['user'])
+        samples = self._samples(user)
+        results = []
+        for name, params in self._pages(options):
+            kwargs = self._kwargs(name, params, samples)
+            if kwargs is None:
+                self.stderr.write(f'{name}: нет данных, пропущено')
+                continue
+            url = reverse(name, kwargs=kwargs)
+            if name in QUERIES:
+                url += '?' + urlencode(QUERIES[name])
+            for label, login in (('anonymous', None), ('user', user)):
+                results.append(
+                    self._measure(name, url, label, login, samples, options)
+                )
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'meta': {
+                    'posts': Post.objects.count(),
+                    'users': User.objects.count(),
+                    'comments': Comment.objects.count(),
+                    'follows': Follow.objects.count(),
+                    'requests': options['requests'],
+                    'cold': options['cold'],
+                },
+                'results': results,
+            }, indent=2, ensure_ascii=False))
+            return
+        for result in results:
+            self.stdout.write(
+                '{name:<24} {client:<9} {status:>3}  '
+                'p50 {p50_ms:7.2f}  p95 {p95_ms:7.2f}  p99 {p99_ms:7.2f} мс  '
+                'SQL {queries:5.1f}  {requests_per_second:8.1f} запр/с'
+                .format(**result)
+            )
+
+    def _user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден.')
+            return user
+        user = (
+            User.objects.filter(stats__isnull=False)
+            .order_by('-stats__following_count', 'pk').first()
+        )
+        if user is None:
+            raise CommandError(
+                'База пуста: сначала выполните generate_data.'
+            )
+        return user
+
+    def _samples(self, user):
+        """Типичные аргументы страниц: самые нагруженные группа и автор."""
+        author = (
+            User.objects.exclude(pk=user.pk).filter(stats__isnull=False)
+            .order_by('-stats__followers_count', 'pk').first()
+        )
+        group = (
+            Group.objects.annotate(posts_count=Count('posts'))
+            .order_by('-posts_count', 'pk').first()
+        )
+        post = (
+            Post.objects.order_by('-comments_count', '-pk').first()
+        )
+        own_post = Post.objects.filter(author=user).order_by('-pk').first()
+        return {
+            'post_id': post and post.pk,
+            'own_post_id': own_post and own_post.pk,
+            'slug': group and group.slug,
+            'username': author and author.username,
+        }
+
+    def _pages(self, options):
+        """Имена страниц вместе с параметрами их маршрутов."""
+        pages = []
+        for app in APPS:
+            patterns = importlib.import_module(f'{app}.urls').urlpatterns
+            for pattern in patterns:
+                name = f'{app}:{pattern.name}'
+                if name in WRITES and not options['writes']:
+                    continue
+                if options['only'] and name not in options['only']:
+                    continue
+                pages.append((name, list(pattern.pattern.converters)))
+        return pages
+
+    def _kwargs(self, name, params, samples):
+        kwargs = {}
+        for param in params:
+            # редактировать можно только свой пост
+            key = 'own_post_id' if name == 'posts:post_edit' else param
+            if samples.get(key) is None:
+                return None
+            kwargs[param] = samples[key]
+        return kwargs
+
+    def _prepare(self, name, client, login, samples):
+        """Возвращает состояние, которое меняет страница; не замеряется."""
+        if login is None:
+            return
+        if name == 'users:logout':
+            client.force_login(login)
+        elif name == 'posts:profile_unfollow':
+            Follow.objects.get_or_create(
+                user=login,
+                author=User.objects.get(username=samples['username']),
+            )
+
+    def _measure(self, name, url, label, login, samples, options):
+        client = Client()
+        if login is not None:
+            client.force_login(login)
+        method = client.post if name in POSTS else client.get
+        data = {'text': 'Замер'} if name in POSTS else None
+        latencies = []
+        queries = 0
+        status = None
+        total = options['warmup'] + options['requests']
+        for index in range(total):
+            if options['cold']:
+                cache.clear()
+            self._prepare(name, client, login, samples)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = method(url, data)
+                elapsed = time.perf_counter() - started
+            if index < options['warmup']:
+                continue
+            latencies.append(elapsed)
+            queries += len(captured)
+            status = response.status_code
+        spent = sum(latencies)
+        return {
+            'name': name,
+            'url': url,
+            'client': label,
+            'status': status,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries': queries / len(latencies) if latencies else 0,
+            'requests_per_second': len(latencies) / spent if spent else 0,
+        }
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, export_tables
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и '
+            'подписки в каталог: по файлу NDJSON или CSV на таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(TABLES),
+            help='Какие таблицы выгрузить (по умолчанию все).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        report = export_tables(
+            options['directory'],
+            file_format=options['format'],
+            tables=options['tables'],
+            chunk_size=options['chunk_size'],
+        )
+        for line in report.lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS('Выгрузка завершена.'))
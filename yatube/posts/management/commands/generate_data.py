@@ -0,0 +1,225 @@
+import datetime as dt
+import io
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import generate
+from posts.transfer import raw_dates, rebuild_derived
+
+WORDS = (
+    'кот собака город утро вечер дорога море солнце книга друг работа '
+    'поезд окно чай кофе дождь снег лес река музыка фильм проект код '
+    'новости погода выходные отпуск семья школа сад горы ветер'
+).split()
+PASSWORD = 'benchmark'
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса степенного закона: первые элементы популярнее."""
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными для нагрузочных '
+            'замеров: пользователи, группы, граф подписок со степенным '
+            'распределением, посты с картинками и комментарии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=16,
+            help='Сколько разных картинок сгенерировать.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.3,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--exponent', type=float, default=1.1)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.finish = timezone.now()
+        self.start = self.finish - dt.timedelta(days=options['days'])
+
+        started = time.monotonic()
+        users = self._users(options['users'], options['prefix'])
+        popularity = zipf_weights(len(users), options['exponent'])
+        groups = self._groups(options['groups'], options['prefix'])
+        self._follows(users, popularity, options['follows'])
+        images = self._images(options['images'], options['prefix'])
+        posts = self._posts(
+            options['posts'], users, popularity, groups, images,
+            options['image_share'],
+        )
+        self._comments(options['comments'], users, posts)
+        self.stdout.write('Пересчёт счётчиков, лент и поиска...')
+        rebuild_derived(chunk_size=self.chunk_size)
+        for name in images:
+            generate(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.monotonic() - started:.1f} с: '
+            f'{len(users)} пользователей, {len(groups)} групп, '
+            f'{options["posts"]} постов, {options["comments"]} '
+            f'комментариев. Пароль пользователей: {PASSWORD}'
+        ))
+
+    def _chunks(self, objects):
+        iterator = iter(objects)
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _save(self, model, objects):
+        with raw_dates(model):
+            for chunk in self._chunks(objects):
+                with transaction.atomic():
+                    model.objects.bulk_create(chunk)
+
+    def _moment(self, share):
+        """Дата на доле share промежутка: id растут вместе с датами."""
+        return self.start + (self.finish - self.start) * min(share, 1)
+
+    def _text(self, low, high):
+        return ' '.join(
+            self.random.choices(WORDS, k=self.random.randint(low, high))
+        ).capitalize()
+
+    def _users(self, count, prefix):
+        first = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        password = make_password(PASSWORD)
+        self._save(User, (
+            User(
+                username=f'{prefix}{first + index}',
+                password=password,
+                date_joined=self._moment(index / count / 2),
+            )
+            for index in range(count)
+        ))
+        return list(
+            User.objects.filter(pk__gte=first).order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def _groups(self, count, prefix):
+        first = (Group.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        self._save(Group, (
+            Group(
+                title=f'Группа {first + index}',
+                slug=f'{prefix}-{first + index}',
+                description=self._text(5, 20),
+            )
+            for index in range(count)
+        ))
+        return list(
+            Group.objects.filter(pk__gte=first).order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def _follows(self, users, popularity, average):
+        def follows():
+            for user_id in users:
+                # у большинства мало подписок, у немногих — очень много
+                wanted = min(
+                    len(users) - 1,
+                    int(self.random.paretovariate(1.5) * average / 3),
+                )
+                authors = set(self.random.choices(
+                    users, cum_weights=popularity, k=wanted
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self._save(Follow, follows())
+
+    def _images(self, count, prefix):
+        names = []
+        for index in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1200, 800), color).save(
+                buffer, 'JPEG', quality=85
+            )
+            names.append(default_storage.save(
+                f'posts/{prefix}-{index}.jpg', ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def _posts(self, count, users, popularity, groups, images, image_share):
+        before = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        def posts():
+            for index in range(count):
+                moment = self._moment(index / count)
+                yield Post(
+                    text=self._text(5, 80),
+                    author_id=self.random.choices(
+                        users, cum_weights=popularity
+                    )[0],
+                    group_id=(
+                        self.random.choice(groups)
+                        if groups and self.random.random() < 0.6 else None
+                    ),
+                    image=(
+                        self.random.choice(images)
+                        if images and self.random.random() < image_share
+                        else ''
+                    ),
+                    pub_date=moment,
+                    last_modified=moment,
+                )
+
+        self._save(Post, posts())
+        span = Post.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        return span['first'], span['last']
+
+    def _comments(self, count, users, posts):
+        first, last = posts
+        if first is None:
+            return
+
+        def comments():
+            for _ in range(count):
+                post_id = self.random.randint(first, last)
+                share = (post_id - first) / max(last - first, 1)
+                # комментарий появляется после поста
+                created = self._moment(
+                    share + self.random.random() * (1 - share)
+                )
+                yield Comment(
+                    post_id=post_id,
+                    author_id=self.random.choice(users),
+                    text=self._text(3, 30),
+                    created=created,
+                )
+
+        self._save(Comment, comments())
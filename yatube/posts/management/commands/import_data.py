@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, import_tables, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = ('Загружает данные, выгруженные export_data. Строки с уже '
+            'существующими id пропускаются; прерванная загрузка '
+            'продолжается с контрольной точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(TABLES),
+            help='Какие таблицы загрузить (по умолчанию все).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк записывать за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не глядя на контрольную точку.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        report = import_tables(
+            options['directory'],
+            file_format=options['format'],
+            tables=options['tables'],
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+        )
+        for line in report.lines():
+            self.stdout.write(line)
+        if not options['skip_rebuild']:
+            with report.measure('rebuild'):
+                rebuild_derived(chunk_size=options['chunk_size'])
+            self.stdout.write(list(report.lines())[-1])
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена.'))
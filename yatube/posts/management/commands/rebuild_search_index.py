@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько записей индексировать за один проход.',
+        )
+
+    def handle(self, *args, **options):
+        indexed = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'В поисковый индекс добавлено {indexed} записей.'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+from posts.feed import sync_direct_feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей обрабатывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        processed = recount(chunk_size=options['chunk_size'])
+        sync_direct_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны для {processed} пользователей.'
+        ))
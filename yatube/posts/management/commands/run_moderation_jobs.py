@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import ModerationJob
+from posts.moderation import run
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задания модерации, которые ждут в очереди или '
+            'были прерваны перезапуском процесса.')
+
+    def handle(self, *args, **options):
+        jobs = ModerationJob.objects.filter(
+            status__in=(ModerationJob.PENDING, ModerationJob.RUNNING)
+        ).order_by('pk')
+        for job in jobs:
+            run(job.pk)
+            job.refresh_from_db()
+            self.stdout.write(
+                f'{job}: {job.get_status_display()}, '
+                f'{job.done} из {job.total}'
+            )
+        self.stdout.write(self.style.SUCCESS('Очередь заданий пуста.'))
@@ -0,0 +1,57 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    stats = {}
+
+    def row(user_id):
+        if user_id not in stats:
+            stats[user_id] = UserStats(user_id=user_id)
+        return stats[user_id]
+
+    for user_id, total in (Post.objects.values_list('author')
+                           .annotate(models.Count('pk')).order_by()):
+        row(user_id).posts_count = total
+    for user_id, total in (Follow.objects.values_list('author')
+                           .annotate(models.Count('pk')).order_by()):
+        row(user_id).followers_count = total
+    for user_id, total in (Follow.objects.values_list('user')
+                           .annotate(models.Count('pk')).order_by()):
+        row(user_id).following_count = total
+    UserStats.objects.bulk_create(stats.values(), batch_size=500)
+    for post in Post.objects.annotate(
+            total=models.Count('comments')).filter(total__gt=0).iterator():
+        Post.objects.filter(pk=post.pk).update(comments_count=post.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Хэш картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_formats',
+            field=models.CharField(blank=True, editable=False, max_length=50, verbose_name='Форматы копий картинки'),
+        ),
+    ]
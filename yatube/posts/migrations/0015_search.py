@@ -0,0 +1,127 @@
+import re
+
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+# копия posts.search на момент миграции: дальнейшие правки модуля не
+# должны менять то, что делает уже применённая миграция
+TABLE = 'posts_search'
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|'
+    r'их|ых|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|'
+    r'ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, count=1)
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    match = RV.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+    if not rv:
+        return word
+
+    stripped = _strip(PERFECTIVE_GERUND, rv)
+    if stripped != rv:
+        rv = stripped
+    else:
+        rv = _strip(REFLEXIVE, rv)
+        stripped = _strip(ADJECTIVE, rv)
+        if stripped != rv:
+            rv = _strip(PARTICIPLE, stripped)
+        else:
+            stripped = _strip(VERB, rv)
+            rv = stripped if stripped != rv else _strip(NOUN, rv)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = re.sub(r'ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def document(text):
+    """Текст в том виде, в каком он лежит в индексе."""
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} '
+                    f'USING fts5(body, post_id UNINDEXED, '
+                    f"tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        except OperationalError:
+            # SQLite собран без FTS5: поиск работает по подстроке
+            return
+        sources = (
+            (Post.objects.values_list('pk', 'pk', 'text'), 0),
+            (Comment.objects.values_list('pk', 'post_id', 'text'), 1),
+        )
+        for queryset, odd in sources:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, body, post_id) '
+                f'VALUES (%s, %s, %s)',
+                (
+                    (pk * 2 + odd, document(text), post_id)
+                    for pk, post_id, text in queryset.iterator()
+                ),
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
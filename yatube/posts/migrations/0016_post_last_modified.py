@@ -0,0 +1,32 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+def fill_last_modified(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(last_modified=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_last_modified, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'last_modified'], name='post_author_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'last_modified'], name='post_group_modified_idx'),
+        ),
+    ]
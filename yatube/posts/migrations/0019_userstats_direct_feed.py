@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+# FEED_FANOUT_LIMIT на момент миграции: повторный прогон не зависит от
+# настроек установки, расхождения исправит sync_direct_feeds
+FANOUT_LIMIT = 5000
+
+
+def mark_direct_feeds(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=FANOUT_LIMIT
+    ).update(direct_feed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_moderation_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='direct_feed',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Лента читается напрямую'),
+        ),
+        migrations.RunPython(mark_direct_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_userstats_direct_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+    ]
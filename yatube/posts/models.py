@@ -1,9 +1,30 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router, transaction
 
 User = get_user_model()
 
 
+class AtomicSaveModel(models.Model):
+    """Модель, которая сохраняется в одной транзакции с post_save.
+
+    Django шлёт post_save уже после записи строки, и без транзакции
+    строка фиксируется раньше, чем обработчики обновят счётчики, ленты
+    и поисковый индекс (см. posts.signals). Здесь ошибка обработчика
+    откатывает и саму запись. post_delete и так идёт в транзакции
+    удаления.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
@@ -13,7 +34,23 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом и только те
+        колонки, которые выводятся в карточке поста."""
+        return (
+            self.select_related('author', 'group')
+            .only(
+                'text', 'pub_date', 'comments_count',
+                'image', 'image_digest', 'image_formats',
+                'author', 'author__username',
+                'author__first_name', 'author__last_name',
+                'group', 'group__slug', 'group__title',
+            )
+        )
+
+
+class Post(AtomicSaveModel):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -42,15 +79,55 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_digest = models.CharField(
+        'Хэш картинки',
+        max_length=40,
+        blank=True,
+        editable=False
+    )
+    image_formats = models.CharField(
+        'Форматы копий картинки',
+        max_length=50,
+        blank=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    last_modified = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'),
+            models.Index(
+                fields=['author', 'last_modified'],
+                name='post_author_modified_idx'),
+            models.Index(
+                fields=['group', 'last_modified'],
+                name='post_group_modified_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -72,12 +149,27 @@ class Comment(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # ключ действия из очереди отложенной записи, см. posts.writebehind
+    idempotency_key = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_order_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -98,6 +190,144 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='unique_follow')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'),
+        ]
 
     def __unicode__(self):
         return self.author.username
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляются вместе с постами и подписками."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # посты автора не раскладываются по лентам, см. posts.feed
+    direct_feed = models.BooleanField(
+        'Лента читается напрямую',
+        default=False,
+        db_index=True
+    )
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_date_idx'),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class ModerationJob(models.Model):
+    """Массовое действие модератора, которое выполняется в фоне."""
+
+    DELETE_POSTS = 'delete_posts'
+    MOVE_POSTS = 'move_posts'
+    PURGE_COMMENTS = 'purge_comments'
+    KINDS = (
+        (DELETE_POSTS, 'Удаление постов'),
+        (MOVE_POSTS, 'Перенос постов в группу'),
+        (PURGE_COMMENTS, 'Удаление комментариев авторов'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Действие', max_length=20, choices=KINDS)
+    status = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    # id постов или, для комментариев, их авторов в формате JSON
+    targets = models.TextField('Цели')
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+        verbose_name='Новая группа'
+    )
+    total = models.PositiveIntegerField('Всего', default=0)
+    done = models.PositiveIntegerField('Обработано', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+        verbose_name='Модератор'
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    finished = models.DateTimeField('Завершено', blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Задание модерации'
+        verbose_name_plural = 'Задания модерации'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.pk}'
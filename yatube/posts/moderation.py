@@ -0,0 +1,214 @@
+"""Массовые действия модератора в фоне: удаление и перенос постов,
+удаление всех комментариев авторов.
+
+Действие админки создаёт ModerationJob и после фиксации транзакции
+ставит его в очередь единственного фонового потока. Задание идёт
+пачками по MODERATION_CHUNK_SIZE строк, каждая пачка — отдельная
+транзакция, после которой растёт job.done: прогресс виден в списке
+заданий в админке. Строки удаляются одним DELETE на пачку, без
+загрузки объектов и сигналов, поэтому комментарии, записи лент,
+поисковый индекс и счётчики обновляются здесь же, а кэш страниц
+сбрасывается один раз, в конце задания.
+
+Задание, прерванное перезапуском процесса, доделывает команда
+``manage.py run_moderation_jobs``: обработанные пачки пропускаются.
+"""
+import collections
+import json
+import logging
+import queue
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from . import counters, search
+from .cache import bump, invalidate_cards, post_scopes
+from .models import Comment, FeedEntry, ModerationJob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items):
+    size = settings.MODERATION_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _raw_delete(queryset):
+    # тот же DELETE ... WHERE, которым Django удаляет строки без сигналов
+    return queryset._raw_delete(queryset.db)
+
+
+def _advance(job, count):
+    # комментарии, написанные во время задания, тоже удаляются, но
+    # прогресс не должен уйти за 100%
+    ModerationJob.objects.filter(pk=job.pk).update(
+        done=Least(F('done') + count, F('total'))
+    )
+
+
+def _bump(scopes):
+    scopes = sorted(scopes)
+    for chunk in _chunks(scopes):
+        bump(*chunk)
+
+
+def _delete_posts(job):
+    scopes = {'posts'}
+    for chunk in _chunks(json.loads(job.targets)[job.done:]):
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pk__in=chunk)
+                .values_list('pk', 'author_id', 'group_id')
+            )
+            post_ids = [pk for pk, _, _ in posts]
+            comment_ids = Comment.objects.filter(
+                post_id__in=post_ids
+            ).values_list('pk', flat=True)
+            search.unindex(
+                *map(search.post_rowid, post_ids),
+                *map(search.comment_rowid, comment_ids),
+            )
+            _raw_delete(Comment.objects.filter(post_id__in=post_ids))
+            _raw_delete(FeedEntry.objects.filter(post_id__in=post_ids))
+            _raw_delete(Post.objects.filter(pk__in=post_ids))
+            authors = collections.Counter(author for _, author, _ in posts)
+            for author_id, deleted in authors.items():
+                counters.change_user(author_id, 'posts_count', -deleted)
+            for pk, author_id, group_id in posts:
+                scopes.update(
+                    post_scopes(Post(pk=pk, author_id=author_id,
+                                     group_id=group_id))
+                )
+            _advance(job, len(chunk))
+    _bump(scopes)
+
+
+def _move_posts(job):
+    scopes = {'posts'}
+    if job.group_id is not None:
+        scopes.add(f'group:{job.group_id}')
+    for chunk in _chunks(json.loads(job.targets)[job.done:]):
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pk__in=chunk)
+                .values_list('pk', 'author_id', 'group_id')
+            )
+            Post.objects.filter(pk__in=chunk).update(
+                group_id=job.group_id, last_modified=timezone.now()
+            )
+            for pk, author_id, group_id in posts:
+                scopes.update(
+                    post_scopes(Post(pk=pk, author_id=author_id,
+                                     group_id=group_id))
+                )
+            _advance(job, len(chunk))
+        # в карточке выводится группа
+        invalidate_cards(pk for pk, _, _ in posts)
+    _bump(scopes)
+
+
+def _purge_comments(job):
+    comments = Comment.objects.filter(
+        author_id__in=json.loads(job.targets)
+    ).order_by('pk')
+    touched = set()
+    while True:
+        with transaction.atomic():
+            rows = list(
+                comments.values_list('pk', 'post_id')
+                [:settings.MODERATION_CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            search.unindex(*(search.comment_rowid(pk) for pk, _ in rows))
+            _raw_delete(Comment.objects.filter(pk__in=[pk for pk, _ in rows]))
+            per_post = collections.Counter(post_id for _, post_id in rows)
+            for post_id, deleted in per_post.items():
+                counters.change_comments(post_id, -deleted)
+            touched.update(per_post)
+            _advance(job, len(rows))
+    invalidate_cards(touched)
+    scopes = {'posts'}
+    for chunk in _chunks(sorted(touched)):
+        for post in Post.objects.filter(pk__in=chunk).only('author', 'group'):
+            scopes.update(post_scopes(post))
+    _bump(scopes)
+
+
+HANDLERS = {
+    ModerationJob.DELETE_POSTS: _delete_posts,
+    ModerationJob.MOVE_POSTS: _move_posts,
+    ModerationJob.PURGE_COMMENTS: _purge_comments,
+}
+
+
+def run(job_id):
+    """Выполняет (или доделывает) задание; ошибка сохраняется в нём."""
+    job = ModerationJob.objects.filter(pk=job_id).first()
+    if job is None or job.status == ModerationJob.DONE:
+        return
+    jobs = ModerationJob.objects.filter(pk=job_id)
+    jobs.update(status=ModerationJob.RUNNING)
+    try:
+        HANDLERS[job.kind](job)
+    except Exception:
+        logger.exception('Не удалось выполнить %s', job)
+        jobs.update(
+            status=ModerationJob.FAILED,
+            error=traceback.format_exc(),
+            finished=timezone.now(),
+        )
+        return
+    jobs.update(status=ModerationJob.DONE, finished=timezone.now())
+
+
+class JobRunner:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def put(self, job_id):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._work, name='moderation', daemon=True
+                )
+                self.thread.start()
+        self.queue.put(job_id)
+
+    def _work(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                run(job_id)
+            finally:
+                connections.close_all()
+                self.queue.task_done()
+
+
+job_runner = JobRunner()
+
+
+def start(kind, targets, user=None, group=None):
+    """Создаёт задание и запускает его после фиксации транзакции."""
+    targets = sorted(set(targets))
+    if kind == ModerationJob.PURGE_COMMENTS:
+        total = Comment.objects.filter(author_id__in=targets).count()
+    else:
+        total = len(targets)
+    job = ModerationJob.objects.create(
+        kind=kind,
+        targets=json.dumps(targets),
+        group=group,
+        total=total,
+        created_by=user,
+    )
+    transaction.on_commit(lambda: job_runner.put(job.pk))
+    return job
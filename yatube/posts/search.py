@@ -0,0 +1,310 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Тексты хранятся в виртуальной таблице posts_search уже в виде основ
+слов: русские слова приводятся стеммером Snowball, поэтому «котами»
+находит «кот» и «коты». rowid строки кодирует источник: чётный —
+пост (2 * id), нечётный — комментарий (2 * id + 1), так что обновление
+и удаление идут по первичному ключу FTS; id поста, к которому относится
+строка, лежит в неиндексируемой колонке post_id. Индекс обновляют сигналы,
+восстановить его целиком можно командой rebuild_search_index.
+"""
+import re
+
+from django.core.paginator import Page, Paginator
+from django.db import connection, transaction
+from django.db.utils import OperationalError
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+TABLE = 'posts_search'
+# совпадение в комментарии весит вдвое меньше совпадения в самом посте
+COMMENT_WEIGHT = 0.5
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|'
+    r'их|ых|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|'
+    r'ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, count=1)
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    match = RV.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+    if not rv:
+        return word
+
+    stripped = _strip(PERFECTIVE_GERUND, rv)
+    if stripped != rv:
+        rv = stripped
+    else:
+        rv = _strip(REFLEXIVE, rv)
+        stripped = _strip(ADJECTIVE, rv)
+        if stripped != rv:
+            rv = _strip(PARTICIPLE, stripped)
+        else:
+            stripped = _strip(VERB, rv)
+            rv = stripped if stripped != rv else _strip(NOUN, rv)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = re.sub(r'ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def document(text):
+    """Текст в том виде, в каком он лежит в индексе."""
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
+
+
+def match_expression(query):
+    """Выражение MATCH: все основы из запроса должны встретиться."""
+    return ' '.join(f'"{stem(word)}"' for word in WORD.findall(query))
+
+
+_fts5 = None
+
+
+def _probe_fts5():
+    with connection.cursor() as cursor:
+        try:
+            with transaction.atomic():
+                cursor.execute(
+                    'CREATE VIRTUAL TABLE temp.posts_search_probe '
+                    'USING fts5(body)'
+                )
+                cursor.execute('DROP TABLE temp.posts_search_probe')
+        except OperationalError:
+            return False
+    return True
+
+
+def available():
+    """Есть ли полнотекстовый индекс: SQLite, собранный с FTS5."""
+    global _fts5
+    if connection.vendor != 'sqlite':
+        return False
+    if _fts5 is None:
+        # проверяется один раз на процесс
+        _fts5 = _probe_fts5()
+    return _fts5
+
+
+def post_rowid(post_id):
+    return post_id * 2
+
+
+def comment_rowid(comment_id):
+    return comment_id * 2 + 1
+
+
+def create_table(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} '
+        f'USING fts5(body, post_id UNINDEXED, '
+        f"tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def index(rows):
+    """Записывает строки (rowid, id поста, текст), заменяя старые."""
+    if not available():
+        return
+    rows = [
+        (rowid, document(text), post_id) for rowid, post_id, text in rows
+    ]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(row[0],) for row in rows],
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, body, post_id) '
+            f'VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def unindex(*rowids):
+    if not available() or not rowids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(rowid,) for rowid in rowids],
+        )
+
+
+def rebuild(chunk_size=1000):
+    """Заново наполняет индекс всеми постами и комментариями."""
+    from .models import Comment, Post
+
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        create_table(cursor)
+        cursor.execute(f'DELETE FROM {TABLE}')
+    indexed = 0
+    sources = (
+        (Post.objects.values_list('pk', 'pk', 'text'), post_rowid),
+        (Comment.objects.values_list('pk', 'post_id', 'text'),
+         comment_rowid),
+    )
+    for queryset, rowid in sources:
+        rows = []
+        for pk, post_id, text in queryset.iterator(chunk_size=chunk_size):
+            rows.append((rowid(pk), post_id, text))
+            if len(rows) >= chunk_size:
+                index(rows)
+                indexed += len(rows)
+                rows = []
+        index(rows)
+        indexed += len(rows)
+    return indexed
+
+
+def post_ids_sql(query, comments=True):
+    """Подзапрос с id найденных постов для фильтра pk__in."""
+    sql = f'SELECT post_id FROM {TABLE} WHERE {TABLE} MATCH %s'
+    if not comments:
+        sql += ' AND rowid %% 2 = 0'
+    return sql, [match_expression(query)]
+
+
+class SearchResults:
+    """Ленивый список найденных постов, от самых релевантных.
+
+    Paginator берёт срез, и по индексу выбираются только id постов
+    одной страницы; сами посты загружаются одним запросом.
+    """
+
+    def __init__(self, query, queryset):
+        self.expression = match_expression(query)
+        self.queryset = queryset
+
+    @cached_property
+    def _count(self):
+        if not self.expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.expression:
+            return []
+        start = index.start or 0
+        limit = -1 if index.stop is None else index.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id, '
+                f'MIN(CASE rowid %% 2 WHEN 0 THEN rank '
+                f'ELSE rank * %s END) AS score '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'GROUP BY post_id ORDER BY score, post_id DESC '
+                f'LIMIT %s OFFSET %s',
+                [COMMENT_WEIGHT, self.expression, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class SearchPage(Page):
+    """Страница поиска со ссылками, которые ждёт paginator.html."""
+
+    def __init__(self, object_list, number, paginator, params=None):
+        super().__init__(object_list, number, paginator)
+        self.params = (params.copy() if params is not None
+                       else QueryDict(mutable=True))
+        self.params.pop('page', None)
+
+    def _query(self, number):
+        params = self.params.copy()
+        params['page'] = number
+        return '?' + params.urlencode()
+
+    @property
+    def first_page_query(self):
+        return self._query(1)
+
+    @property
+    def previous_page_query(self):
+        return self._query(self.previous_page_number())
+
+    @property
+    def next_page_query(self):
+        return self._query(self.next_page_number())
+
+    @property
+    def last_page_query(self):
+        return self._query(self.paginator.num_pages)
+
+
+class SearchPaginator(Paginator):
+    def __init__(self, *args, params=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.params = params
+
+    def _get_page(self, object_list, number, paginator):
+        return SearchPage(object_list, number, paginator, self.params)
+
+
+def search_posts(query, queryset, per_page, number=None, params=None):
+    if available():
+        results = SearchResults(query, queryset)
+    else:
+        # без FTS5 остаётся медленный, но рабочий поиск по подстроке
+        results = queryset.filter(text__icontains=query.strip())
+        if not query.strip():
+            results = results.none()
+    paginator = SearchPaginator(results, per_page, params=params)
+    return paginator.get_page(number)
@@ -0,0 +1,144 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, feed, search
+from .cache import invalidate_on_commit, post_scopes
+from .models import Comment, Follow, Group, Post, User
+
+# поля автора, которые выводятся в карточке поста
+AUTHOR_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # группа до правки: страницы старой группы тоже нужно сбросить
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    image = instance.__dict__.get('image')
+    instance._initial_image = getattr(image, 'name', image)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # копии старой картинки больше не подходят, пока воркер не сделает новые
+    if ('image' in instance.__dict__
+            and instance.image.name != instance._initial_image):
+        instance.image_digest = ''
+        instance.image_formats = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields=None, using=None,
+               **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        feed.fan_out(instance)
+    if update_fields is None or 'text' in update_fields:
+        search.index([
+            (search.post_rowid(instance.pk), instance.pk, instance.text)
+        ])
+    invalidate_on_commit(
+        [instance.pk],
+        post_scopes(instance, instance._initial_group_id),
+        using,
+    )
+    instance._initial_group_id = instance.group_id
+    instance._initial_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, using=None, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    search.unindex(search.post_rowid(instance.pk))
+    invalidate_on_commit([instance.pk], post_scopes(instance), using)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, update_fields=None,
+                  using=None, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+    else:
+        Post.objects.filter(pk=instance.post_id).update(
+            last_modified=timezone.now()
+        )
+    if update_fields is None or 'text' in update_fields:
+        search.index([(
+            search.comment_rowid(instance.pk),
+            instance.post_id,
+            instance.text,
+        )])
+    invalidate_on_commit(
+        [instance.post_id], post_scopes(instance.post), using
+    )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using=None, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    search.unindex(search.comment_rowid(instance.pk))
+    # при удалении поста вызывается на каждый комментарий: пост ищется
+    # один раз на всё удаление, уже после фиксации
+    invalidate_on_commit(
+        [instance.post_id], using=using, scope_posts=[instance.post_id]
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, using=None, **kwargs):
+    invalidate_on_commit(
+        instance.posts.values_list('pk', flat=True).iterator(),
+        ('posts', f'group:{instance.pk}', f'group:{instance.pk}:meta'),
+        using,
+    )
+
+
+def _author_card(user):
+    return tuple(user.__dict__.get(field) for field in AUTHOR_CARD_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._initial_card = _author_card(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, using=None, **kwargs):
+    # смена пароля или вход не меняют карточки
+    card = _author_card(instance)
+    changed = card != instance._initial_card
+    instance._initial_card = card
+    if created or not changed:
+        return
+    invalidate_on_commit(
+        instance.posts.values_list('pk', flat=True).iterator(),
+        ('posts', f'author:{instance.pk}'),
+        using,
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, using=None, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        counters.change_user(instance.user_id, 'following_count', 1)
+        feed.update_direct_feed(instance.author_id)
+        feed.backfill(instance.user_id, instance.author_id)
+    invalidate_on_commit(
+        scopes=(f'author:{instance.author_id}', f'author:{instance.user_id}'),
+        using=using,
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, using=None, **kwargs):
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    counters.change_user(instance.user_id, 'following_count', -1)
+    feed.update_direct_feed(instance.author_id)
+    feed.prune(instance.user_id, instance.author_id)
+    invalidate_on_commit(
+        scopes=(f'author:{instance.author_id}', f'author:{instance.user_id}'),
+        using=using,
+    )
@@ -0,0 +1,25 @@
+from django import template
+
+from ..derivatives import fallback_url, picture_sources
+from ..thumbnails import thumbnail_url
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    sources = picture_sources(post)
+    if sources:
+        return {
+            'post': post,
+            'sources': sources,
+            'thumbnail_url': fallback_url(post),
+        }
+    if hasattr(post, 'thumbnail_url'):
+        url = post.thumbnail_url
+    else:
+        url = thumbnail_url(post.image)
+    return {
+        'post': post,
+        'thumbnail_url': url,
+    }
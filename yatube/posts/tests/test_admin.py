@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..admin import EstimatedCountPaginator
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'auth{index}')
+            for index in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(title=f'Группа {index}', slug=f'g{index}')
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        # первый запрос после входа кладёт пользователя в кэш
+        self.client.get(reverse('admin:index'))
+
+    def add_rows(self, count):
+        for index in range(count):
+            author = self.authors[index % 3]
+            post = Post.objects.create(
+                author=author, group=self.groups[index % 3], text='Пост'
+            )
+            Comment.objects.create(post=post, author=author, text='Комм')
+        for user in self.authors:
+            for author in self.authors:
+                if user != author:
+                    Follow.objects.get_or_create(user=user, author=author)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк на странице."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:posts_{model}_changelist')
+                self.add_rows(2)
+                few = self.queries(url)
+                self.add_rows(10)
+                self.assertEqual(self.queries(url), few)
+
+    def test_changelist_does_not_count_whole_table(self):
+        self.add_rows(3)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT COUNT(*)')
+            for query in captured.captured_queries
+        ))
+
+    def test_estimated_count(self):
+        self.add_rows(5)
+        Post.objects.filter(pk=Post.objects.order_by('pk')[1].pk).delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        # удалённая строка в середине диапазона оценку не меняет
+        self.assertEqual(paginator.count, 5)
+        filtered = Post.objects.filter(group=self.groups[0])
+        self.assertEqual(
+            EstimatedCountPaginator(filtered, 10).count, filtered.count()
+        )
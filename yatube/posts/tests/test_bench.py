@@ -0,0 +1,75 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_data', users=30, groups=3, posts=200, comments=100,
+            follows=5, images=1, image_share=0.5, stdout=StringIO(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generated_data(self):
+        """Генератор создаёт связанные данные и пересчитывает производные."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(
+            Post.objects.exclude(image='').filter(image_digest='').exists()
+        )
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        # популярность авторов подчиняется степенному закону
+        first, last = (
+            User.objects.order_by('pk').first(),
+            User.objects.order_by('pk').last(),
+        )
+        self.assertGreater(first.posts.count(), last.posts.count())
+
+    def test_benchmark_covers_every_page(self):
+        out = StringIO()
+        call_command(
+            'bench_views', requests=2, warmup=0, writes=True, json=True,
+            stdout=out, stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['posts'], 200)
+        pages = {row['name'] for row in report['results']}
+        self.assertEqual(pages, {
+            'posts:main', 'posts:group', 'posts:profile',
+            'posts:post_detail', 'posts:post_create', 'posts:post_edit',
+            'posts:add_comment', 'posts:comments', 'posts:follow_index',
+            'posts:search', 'posts:profile_follow', 'posts:profile_unfollow',
+            'users:signup', 'users:logout', 'users:login', 'users:reset',
+            'about:author', 'about:tech',
+        })
+        for row in report['results']:
+            with self.subTest(name=row['name'], client=row['client']):
+                self.assertIn(row['status'], (200, 302))
+                self.assertGreater(row['requests_per_second'], 0)
+                self.assertGreaterEqual(row['p99_ms'], row['p50_ms'])
@@ -0,0 +1,287 @@
+import hashlib
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import get_or_compute
+from core.testing import run_on_commit
+
+from ..cache import PAGE_KEY
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Исходный текст',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+        self.address = reverse('posts:group', kwargs={'slug': 'test-slug'})
+
+    def test_cards_are_cached(self):
+        """Карточка берётся из кэша, пока пост не менялся."""
+        self.client.get(self.address)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.client.get(self.address)
+        self.assertContains(response, 'Исходный текст')
+
+    def test_edit_invalidates_card(self):
+        """Правка через post_edit сразу видна в ленте группы."""
+        self.client.get(self.address)
+        with run_on_commit():
+            self.authorized_author.post(
+                reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+                data={'text': 'Новый текст', 'group': self.group.pk},
+            )
+        response = self.client.get(self.address)
+        self.assertContains(response, 'Новый текст')
+
+    def test_comment_invalidates_card(self):
+        self.client.get(self.address)
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Ок'
+            )
+        response = self.client.get(self.address)
+        self.assertContains(response, 'комментариев: 1')
+
+    def test_post_delete_resets_cache_once(self):
+        """Каскадное удаление комментариев не ищет пост на каждый из них
+        и сбрасывает кэш одним вызовом."""
+        post = Post.objects.create(
+            author=self.author, text='Удаляемый', group=self.group
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text='Ок')
+            for _ in range(5)
+        )
+        pk = post.pk
+        with mock.patch('posts.cache.bump') as bump:
+            with CaptureQueriesContext(connection) as queries:
+                with run_on_commit():
+                    post.delete()
+        lookups = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "posts_post"' in query['sql']
+        ]
+        self.assertLessEqual(len(lookups), 1)
+        bump.assert_called_once()
+        self.assertIn(f'post:{pk}', bump.call_args[0])
+
+    def test_only_author_card_fields_invalidate(self):
+        """Смена пароля не сбрасывает карточки автора, смена имени —
+        сбрасывает."""
+        author = User.objects.get(pk=self.author.pk)
+        with mock.patch('posts.cache.bump') as bump:
+            with run_on_commit():
+                author.set_password('новый пароль')
+                author.save()
+            bump.assert_not_called()
+            with run_on_commit():
+                author.first_name = 'Лев'
+                author.save()
+            bump.assert_called_once()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Первый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.address = reverse('posts:group', kwargs={'slug': 'test-slug'})
+
+    def test_page_served_from_cache(self):
+        self.client.get(self.address)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.address)
+        self.assertContains(response, 'Первый пост')
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_write_bumps_group_generation(self):
+        """Новый пост в группе сразу сбрасывает её страницы."""
+        self.client.get(self.address)
+        with run_on_commit():
+            Post.objects.create(
+                author=self.author, text='Второй пост', group=self.group
+            )
+        response = self.client.get(self.address)
+        self.assertContains(response, 'Второй пост')
+
+    def test_bump_waits_for_commit(self):
+        """До фиксации транзакции страница не сбрасывается: иначе
+        параллельный запрос сохранил бы старые строки под новым
+        поколением."""
+        self.client.get(self.address)
+        with run_on_commit():
+            Post.objects.create(
+                author=self.author, text='Второй пост', group=self.group
+            )
+            with self.assertNumQueries(0):
+                self.client.get(self.address)
+        response = self.client.get(self.address)
+        self.assertContains(response, 'Второй пост')
+
+    def test_etag_returns_not_modified(self):
+        response = self.client.get(self.address)
+        response = self.client.get(
+            self.address, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_authorized_user_bypasses_cache(self):
+        """Авторизованный пользователь не получает страницу анонима."""
+        self.client.get(reverse('posts:main'))
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:main'))
+        self.assertContains(response, 'Избранные авторы')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+        self.addresses = (
+            reverse('posts:group', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_not_modified_without_rendering(self):
+        """Повторный визит получает 304 одним запросом к базе."""
+        for address in self.addresses:
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                self.assertIn('Last-Modified', response)
+                # без кэша страниц ответ даёт сам условный GET
+                cache.delete(PAGE_KEY.format(
+                    hashlib.md5(address.encode()).hexdigest()
+                ))
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        address, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        for address in self.addresses:
+            with self.subTest(address=address):
+                response = self.authorized_author.get(address)
+                self.assertIn('private', response['Cache-Control'])
+                response = self.authorized_author.get(
+                    address,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_change_validators(self):
+        """Правка поста и комментарий обновляют ETag и дату изменения."""
+        address = self.addresses[2]
+        etag = self.authorized_author.get(address)['ETag']
+        modified = self.post.last_modified
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.last_modified, modified)
+        response = self.authorized_author.get(
+            address, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_generation_moves_last_modified(self):
+        """Удаление поста и новая подписка двигают Last-Modified."""
+        extra = Post.objects.create(
+            author=self.author, text='Удаляемый пост', group=self.group
+        )
+        reader = User.objects.create_user(username='reader')
+        changes = (
+            (self.addresses[0], extra.delete),
+            (self.addresses[1], lambda: Follow.objects.create(
+                user=reader, author=self.author
+            )),
+        )
+        for minutes, (address, change) in enumerate(changes, start=1):
+            with self.subTest(address=address):
+                since = self.authorized_author.get(address)['Last-Modified']
+                # смена поколения позже даты последней правки постов
+                later = time.time() + 60 * minutes
+                with mock.patch('posts.cache.time.time', return_value=later):
+                    with run_on_commit():
+                        change()
+                response = self.authorized_author.get(
+                    address, HTTP_IF_MODIFIED_SINCE=since
+                )
+                self.assertEqual(response.status_code, 200)
+
+
+class StampedeProtectionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой воркер пересчитывает ключ, отдаётся старое значение."""
+        cache.set('hot', (1, 0.1, time.time() - 1), 60)
+        cache.add('hot:lock', 1)
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+        self.assertEqual(self.calls, 0)
@@ -0,0 +1,71 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='auth')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Ок'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+
+    def test_failed_counter_rolls_back_write(self):
+        """Запись и её счётчики фиксируются или откатываются вместе."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        with mock.patch(
+            'posts.signals.counters.change_comments',
+            side_effect=DatabaseError,
+        ), self.assertRaises(DatabaseError):
+            Comment.objects.create(post=post, author=self.user, text='Ок')
+        self.assertFalse(Comment.objects.exists())
+
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+            raise DatabaseError
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+
+    def test_recount_repairs_counters(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Ок')
+        Post.objects.update(comments_count=7)
+        UserStats.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..counters import recount
+from ..feed import celebrity_ids, feed_for, sync_direct_feeds
+from ..models import FeedEntry, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='auth')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_backfills_and_post_fans_out(self):
+        """Подписка переносит старые посты, новые раскладываются сразу."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            set(feed_for(self.reader)), {self.old_post, new_post}
+        )
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_unfollow_prunes_feed(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertFalse(feed_for(self.reader).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(
+            FeedEntry.objects.filter(post=new_post).exists()
+        )
+        self.assertIn(new_post, feed_for(self.reader))
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_posts_of_formerly_popular_author_reach_feeds(self):
+        """Посты, вышедшие у популярного автора, попадают в ленты,
+        когда подписчиков становится меньше порога."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        self.assertTrue(UserStats.objects.get(user=self.author).direct_feed)
+        popular_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(
+            FeedEntry.objects.filter(post=popular_post).exists()
+        )
+        follow.delete()
+        self.assertFalse(UserStats.objects.get(user=self.author).direct_feed)
+        self.assertEqual(celebrity_ids(), frozenset())
+        self.assertEqual(
+            set(feed_for(self.reader)), {self.old_post, popular_post}
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=popular_post
+        ).exists())
+
+    def test_recount_keeps_and_syncs_marks(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        with override_settings(FEED_FANOUT_LIMIT=1):
+            recount()
+            sync_direct_feeds()
+            self.assertTrue(
+                UserStats.objects.get(user=self.author).direct_feed
+            )
+        recount()
+        self.assertTrue(UserStats.objects.get(user=self.author).direct_feed)
+        sync_direct_feeds()
+        self.assertFalse(UserStats.objects.get(user=self.author).direct_feed)
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..feed import FEED_ORDERING, feed_for
+from ..models import Comment, Follow, Group, Post
+from ..utils import DEFAULT_ORDERING, CursorPaginator
+
+User = get_user_model()
+
+
+class QueryPlanTest(TestCase):
+    """Ленты читаются по составным индексам без сортировки во временном
+    B-дереве, и переход по курсору ищет по диапазону индекса."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+
+    def plans(self, queryset, ordering):
+        paginator = CursorPaginator(queryset, 10, ordering)
+        values = paginator.key(queryset.get(pk=self.post.pk))
+        first_page = queryset.order_by(*ordering)[:11]
+        next_page = queryset.filter(
+            paginator._seek(values, False)
+        ).order_by(*ordering)[:11]
+        return first_page.explain(), next_page.explain()
+
+    def test_feed_views_use_composite_indexes(self):
+        feeds = {
+            'post_date_idx': (Post.objects.for_feed(), DEFAULT_ORDERING),
+            'post_group_date_idx': (
+                Post.objects.for_feed().filter(group=self.group),
+                DEFAULT_ORDERING,
+            ),
+            'post_author_date_idx': (
+                Post.objects.for_feed().filter(author=self.author),
+                DEFAULT_ORDERING,
+            ),
+            'feed_user_date_idx': (
+                feed_for(self.user).for_feed(), FEED_ORDERING
+            ),
+        }
+        for index, (queryset, ordering) in feeds.items():
+            for plan in self.plans(queryset, ordering):
+                with self.subTest(index=index, plan=plan):
+                    self.assertIn(index, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+            with self.subTest(index=index):
+                self.assertRegex(plan, r'(pub_date|feed_date)[<>]')
+
+    def test_comments_and_follows_use_indexes(self):
+        plans = {
+            'comment_post_order_idx': Comment.objects.filter(
+                post=self.post
+            ).order_by('created', 'id'),
+            'follow_author_user_idx': Follow.objects.filter(
+                author=self.author
+            ).values('user'),
+        }
+        for index, queryset in plans.items():
+            plan = queryset.explain()
+            with self.subTest(index=index, plan=plan):
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,148 @@
+from django.contrib.auth import get_user_model
+from django.contrib.admin import helpers
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, FeedEntry, Follow, Group, ModerationJob, Post
+from ..moderation import run
+from ..search import SearchResults
+
+User = get_user_model()
+
+
+@override_settings(MODERATION_CHUNK_SIZE=2)
+class ModerationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Старая', slug='old')
+        cls.new_group = Group.objects.create(title='Новая', slug='new')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {index}'
+            )
+            for index in range(5)
+        ]
+        for post in self.posts:
+            Comment.objects.create(
+                post=post, author=self.reader, text='Спам-комментарий'
+            )
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def action(self, model, action, objects, **data):
+        response = self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            {
+                'action': action,
+                helpers.ACTION_CHECKBOX_NAME: [obj.pk for obj in objects],
+                **data,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        job = ModerationJob.objects.get()
+        self.assertEqual(job.status, ModerationJob.PENDING)
+        run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ModerationJob.DONE, job.error)
+        self.assertEqual(job.done, job.total)
+        return job
+
+    def test_delete_posts(self):
+        """Посты удаляются в фоне вместе со всем, что на них ссылается."""
+        main = reverse('posts:main')
+        Client().get(main)
+        self.action('post', 'delete_in_background', self.posts[:3])
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(len(SearchResults('пост', Post.objects.all())), 2)
+        self.assertNotContains(Client().get(main), 'Пост 0')
+
+    def test_standard_delete_is_replaced(self):
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertNotContains(response, 'value="delete_selected"')
+        self.assertContains(response, 'value="delete_in_background"')
+
+    def test_move_posts_to_group(self):
+        group_page = reverse('posts:group', kwargs={'slug': 'new'})
+        Client().get(group_page)
+        self.action(
+            'post', 'move_to_group', self.posts, group=self.new_group.pk
+        )
+        self.assertFalse(self.group.posts.exists())
+        self.assertEqual(self.new_group.posts.count(), 5)
+        self.assertContains(Client().get(group_page), 'Пост 4')
+
+    def test_move_requires_group(self):
+        self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'move_to_group',
+                helpers.ACTION_CHECKBOX_NAME: [self.posts[0].pk],
+            },
+        )
+        self.assertFalse(ModerationJob.objects.exists())
+
+    def test_purge_comments_by_author(self):
+        own = Comment.objects.create(
+            post=self.posts[0], author=self.author, text='Ответ'
+        )
+        comment = Comment.objects.filter(author=self.reader).first()
+        job = self.action('comment', 'purge_authors_comments', [comment])
+        self.assertEqual(job.total, 5)
+        self.assertEqual(list(Comment.objects.all()), [own])
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].comments_count, 1)
+
+    def test_purge_progress_capped_at_total(self):
+        """Комментарии, появившиеся после запуска, не дают больше 100%."""
+        comment = Comment.objects.filter(author=self.reader).first()
+        self.client.post(
+            reverse('admin:posts_comment_changelist'),
+            {
+                'action': 'purge_authors_comments',
+                helpers.ACTION_CHECKBOX_NAME: [comment.pk],
+            },
+        )
+        job = ModerationJob.objects.get()
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Ещё спам'
+        )
+        run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.done, job.total), (5, 5))
+        self.assertFalse(Comment.objects.filter(author=self.reader).exists())
+
+    def test_interrupted_job_resumes(self):
+        """Пачки, обработанные до перезапуска, не повторяются."""
+        self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'delete_in_background',
+                helpers.ACTION_CHECKBOX_NAME: [
+                    post.pk for post in self.posts
+                ],
+            },
+        )
+        job = ModerationJob.objects.get()
+        ModerationJob.objects.filter(pk=job.pk).update(
+            status=ModerationJob.RUNNING, done=2
+        )
+        run(job.pk)
+        self.assertEqual(
+            list(Post.objects.order_by('pk')), self.posts[:2]
+        )
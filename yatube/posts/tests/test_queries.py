@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    """Число SQL-запросов страницы не зависит от числа постов на ней.
+
+    Страницы группы, профиля и поста тратят ещё один запрос на дату
+    изменения для условного GET. Сессия и пользователь берутся из кэша.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for index in range(settings.PAGINATOR_PAGE + 1):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Пост {index}',
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=cls.user, text='Ок')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertQueryBudget(self, client, address, budget):
+        with self.subTest(address=address):
+            with self.assertNumQueries(budget):
+                client.get(address)
+
+    def test_anonymous_query_budget(self):
+        budgets = {
+            reverse('posts:main'): 1,
+            reverse('posts:group', kwargs={'slug': self.group.slug}): 3,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 3,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 3,
+        }
+        for address, budget in budgets.items():
+            self.assertQueryBudget(self.client, address, budget)
+
+    def test_authorized_query_budget(self):
+        # первый запрос после входа кладёт пользователя в кэш
+        self.authorized_client.get(reverse('about:author'))
+        budgets = {
+            reverse('posts:main'): 1,
+            reverse('posts:follow_index'): 2,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 4,
+        }
+        for address, budget in budgets.items():
+            self.assertQueryBudget(self.authorized_client, address, budget)
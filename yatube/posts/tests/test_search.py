@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+from .. import search
+from ..search import SearchResults, stem
+
+User = get_user_model()
+
+
+class StemTest(TestCase):
+    def test_russian_word_forms_share_stem(self):
+        """Формы одного слова приводятся к одной основе."""
+        self.assertEqual(
+            {stem(word) for word in ('кот', 'коты', 'котами')}, {'кот'}
+        )
+        self.assertEqual(stem('Ёлки'), stem('елки'))
+        self.assertEqual(stem('Python'), 'python')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Мои коты спят на диване'
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе'
+        )
+        Comment.objects.create(
+            post=cls.dogs, author=cls.user, text='А у соседей живёт кот'
+        )
+
+    def found(self, query):
+        return list(SearchResults(query, Post.objects.all())[:10])
+
+    def test_post_ranked_above_comment_match(self):
+        """Совпадение в посте выше совпадения в комментарии."""
+        self.assertEqual(self.found('котами'), [self.cats, self.dogs])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление постов и комментариев попадают в индекс."""
+        self.cats.text = 'Теперь здесь про попугаев'
+        self.cats.save()
+        self.assertEqual(self.found('кот'), [self.dogs])
+        self.assertEqual(self.found('попугай'), [self.cats])
+        self.dogs.comments.all().delete()
+        self.assertEqual(self.found('кот'), [])
+
+    @override_settings(PAGINATOR_PAGE=1)
+    def test_search_page_is_paginated(self):
+        """Страница поиска показывает результаты постранично."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), [self.cats])
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertEqual(
+            page_obj.next_page_query, '?q=%D0%BA%D0%BE%D1%82&page=2'
+        )
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'page': 2}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.dogs])
+
+    def test_empty_query(self):
+        """Запрос без слов ничего не находит и не ломает MATCH."""
+        response = self.client.get(reverse('posts:search'), {'q': '!!!'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты через полнотекстовый индекс."""
+        request = RequestFactory().get('/')
+        admin = site._registry[Post]
+        queryset, duplicates = admin.get_search_results(
+            request, Post.objects.all(), 'собаки'
+        )
+        self.assertFalse(duplicates)
+        self.assertIn('posts_search', str(queryset.query))
+        self.assertEqual(list(queryset), [self.dogs])
+
+
+class AvailabilityTest(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, search, '_fts5', search._fts5)
+        search._fts5 = None
+
+    def test_fts5_is_probed_once(self):
+        with mock.patch.object(
+            search, '_probe_fts5', return_value=True
+        ) as probe:
+            self.assertTrue(search.available())
+            self.assertTrue(search.available())
+        probe.assert_called_once()
+
+    def test_falls_back_to_substring_without_fts5(self):
+        """Без FTS5 поиск идёт по подстроке, а индекс не трогается."""
+        user = User.objects.create_user(username='auth')
+        with mock.patch.object(search, '_probe_fts5', return_value=False):
+            post = Post.objects.create(author=user, text='Рыжий кот')
+            page = search.search_posts('кот', Post.objects.all(), 10)
+            self.assertEqual(list(page), [post])
+            self.assertEqual(search.rebuild(), 0)
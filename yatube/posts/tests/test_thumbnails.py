@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+
+from ..models import Post
+from ..thumbnails import (attach_thumbnails, generate, thumbnail_queue,
+                          thumbnail_url)
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=small_gif,
+                content_type='image/gif',
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_missing_thumbnail_is_queued(self):
+        """Без готовой миниатюры рендер не трогает PIL, а ставит задачу."""
+        with mock.patch('posts.thumbnails.transaction.on_commit') as on_commit:
+            self.assertIsNone(thumbnail_url(self.post.image))
+        (callback,), _ = on_commit.call_args
+        with mock.patch.object(thumbnail_queue, 'put') as put:
+            callback()
+        put.assert_called_once_with(self.post.image.name)
+
+    def test_failed_image_is_not_requeued(self):
+        """Картинка, которую не удалось обработать, не ставится снова."""
+        name = self.post.image.name
+        with mock.patch('posts.thumbnails.generate', side_effect=OSError), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnail_queue.put(name)
+            thumbnail_queue.queue.join()
+        with mock.patch('posts.thumbnails.transaction.on_commit') as on_commit:
+            self.assertIsNone(thumbnail_url(self.post.image))
+            attach_thumbnails([self.post])
+        on_commit.assert_not_called()
+        cache.clear()
+        with mock.patch('posts.thumbnails.transaction.on_commit') as on_commit:
+            thumbnail_url(self.post.image)
+        on_commit.assert_called_once()
+
+    def test_generated_thumbnail_is_looked_up(self):
+        generate(self.post.image.name)
+        url = thumbnail_url(self.post.image)
+        self.assertTrue(url.startswith(settings.MEDIA_URL + 'cache/'))
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        """Промахи кэша для всей страницы закрываются одним запросом."""
+        generate(self.post.image.name)
+        cache.clear()
+        posts = [Post.objects.get(pk=self.post.pk) for _ in range(3)]
+        with self.assertNumQueries(1):
+            attach_thumbnails(posts)
+        with self.assertNumQueries(0):
+            attach_thumbnails(posts)
+        self.assertEqual(
+            {post.thumbnail_url for post in posts},
+            {thumbnail_url(self.post.image)},
+        )
+
+    def test_derivatives_render_picture(self):
+        """После генерации карточка отдаёт <picture> с WebP и srcset."""
+        generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(len(post.image_digest), 40)
+        html = Template('{% load post_images %}{% post_image post %}').render(
+            Context({'post': post})
+        )
+        self.assertIn('<picture>', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('/960.webp 960w', html)
+
+    def test_new_image_resets_derivatives(self):
+        generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = 'posts/other.gif'
+        post.save()
+        self.assertEqual(post.image_digest, '')
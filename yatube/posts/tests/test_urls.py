@@ -38,6 +38,7 @@ class PostUrlTest(TestCase):
             'posts/index.html': '/',
             'posts/group_list.html': f'/group/{self.group.slug}/',
             'posts/post_detail.html': f'/posts/{self.post.pk}/',
+            'posts/search.html': '/search/?q=пост',
         }
         urls_status_code_author = {
             'posts/create_post.html': f'/posts/{self.post.pk}/edit/',
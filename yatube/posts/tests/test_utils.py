@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..models import Post
+from ..utils import CursorPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        for index in range(25):
+            Post.objects.create(author=cls.author, text=f'Пост {index}')
+        cls.ordered = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('pk', flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.paginator = CursorPaginator(Post.objects.all(), 10)
+
+    def ids(self, page):
+        return [post.pk for post in page]
+
+    def test_forward_navigation(self):
+        """Переход по курсорам вперёд проходит ленту без пропусков."""
+        seen = []
+        page = self.paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(self.ids(page))
+            if not page.has_next():
+                break
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual(len(page), 5)
+
+    def test_backward_navigation(self):
+        """Курсор назад возвращает предыдущую страницу целиком."""
+        first = self.paginator.get_page()
+        second = self.paginator.get_page(first.next_cursor)
+        back = self.paginator.get_page(second.previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_last_page(self):
+        """Курсор последней страницы не требует подсчёта записей."""
+        page = self.paginator.get_page(encode_cursor(None, reverse=True))
+        self.assertEqual(self.ids(page), self.ordered[-10:])
+        self.assertFalse(page.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        page = self.paginator.get_page('не-курсор')
+        self.assertEqual(self.ids(page), self.ordered[:10])
+        self.assertIsNone(decode_cursor('%%%'))
+
+    def test_crafted_cursor_returns_first_page(self):
+        """Подделанные значения курсора не роняют запрос."""
+        for values in (
+            [None, None],
+            [{'a': 1}, 1],
+            [[1], [2]],
+            ['2020-01-01T00:00:00', 10 ** 30],
+            ['2020-01-01T00:00:00', -10 ** 30],
+            ['2020-01-01T00:00:00'],
+        ):
+            with self.subTest(values=values):
+                page = self.paginator.get_page(encode_cursor(values))
+                self.assertEqual(self.ids(page), self.ordered[:10])
+                self.assertFalse(page.has_previous())
+
+    def test_huge_page_number(self):
+        """Номер страницы за пределами ленты ведёт на последнюю."""
+        for number in ('99999999999999999999999', '100001', '-5'):
+            with self.subTest(number=number):
+                page = self.paginator.get_page(number=number)
+                expected = (
+                    self.ordered[:10] if number == '-5'
+                    else self.ordered[-10:]
+                )
+                self.assertEqual(self.ids(page), expected)
+
+    def test_legacy_page_number(self):
+        page = self.paginator.get_page(number='3')
+        self.assertEqual(self.ids(page), self.ordered[20:])
+        self.assertTrue(page.has_previous())
+
+    def test_count_is_cached(self):
+        self.assertEqual(self.paginator.count, 25)
+        Post.objects.create(author=self.author, text='Ещё пост')
+        with self.assertNumQueries(0):
+            paginator = CursorPaginator(Post.objects.all(), 10)
+            self.assertEqual(paginator.count, 25)
@@ -9,7 +9,9 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from core.testing import run_on_commit
+
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -193,7 +195,33 @@ class PostViewTest(TestCase):
         )
         response = (self.authorized_client.get(reverse(
             'posts:post_detail', kwargs={'post_id': self.post.pk})))
-        self.assertEqual(response.context['comments'].count(), 1)
+        self.assertEqual(len(response.context['comments']), 1)
+
+    @override_settings(COMMENTS_PAGE=2)
+    def test_comments_paginated(self):
+        """Комментарии выводятся постранично, дальше — фрагментом."""
+        comments = [
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Комментарий {index}'
+            )
+            for index in range(3)
+        ]
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page = response.context['comments']
+        self.assertEqual(list(page), comments[:2])
+        self.assertTrue(page.has_next())
+        fragment = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        self.assertContains(response, fragment + page.next_page_query)
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(
+                fragment + page.next_page_query
+            )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(list(response.context['comments']), comments[2:])
+        self.assertContains(response, 'Комментарий 2')
+        self.assertNotContains(response, 'Комментарий 1')
 
     def test_create_post(self):
         form_data = {
@@ -288,10 +316,14 @@ class PostViewTest(TestCase):
 
     def test_caching_page(self):
         """Проверка кэширование на главной странице."""
+        cache.clear()
         response_start = self.client.get(reverse('posts:main'))
-        Post.objects.latest('id').delete()
+        Post.objects.filter(pk=Post.objects.latest('id').pk).update(
+            text='Правка в обход сигналов'
+        )
         response = self.client.get(reverse('posts:main'))
         self.assertEqual(response_start.content, response.content)
-        cache.clear()
+        with run_on_commit():
+            Post.objects.latest('id').delete()
         response = self.client.get(reverse('posts:main'))
         self.assertNotEquals(response_start.content, response.content)
@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Post
+from ..search import SearchResults
+from ..writebehind import _pairs_filter, apply, write_queue
+
+User = get_user_model()
+TEMP_QUEUE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    WRITE_BEHIND=True,
+    WRITE_BEHIND_QUEUE=os.path.join(TEMP_QUEUE_DIR, 'queue.sqlite3'),
+)
+class WriteBehindTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_QUEUE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def tearDown(self):
+        write_queue._connection().execute('DELETE FROM ops')
+
+    def comment(self, text):
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': text},
+        )
+
+    def test_comment_visible_to_author_before_write(self):
+        """Свой комментарий виден сразу, в базу он попадает пачкой."""
+        etag = self.authorized_client.get(self.detail)['ETag']
+        self.comment('Отложенный комментарий')
+        self.assertFalse(Comment.objects.exists())
+        response = self.authorized_client.get(
+            self.detail, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Отложенный комментарий')
+        self.assertNotContains(
+            self.client.get(self.detail), 'Отложенный комментарий'
+        )
+
+    def test_batch_applied_with_side_effects(self):
+        """Пачка комментариев пишется одной транзакцией со счётчиками."""
+        for index in range(3):
+            self.comment(f'Комментарий {index}')
+        self.assertEqual(write_queue.drain(), 3)
+        self.assertEqual(self.post.comments.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual(
+            list(SearchResults('комментарий', Post.objects.all())[:10]),
+            [self.post],
+        )
+        response = self.authorized_client.get(self.detail)
+        self.assertEqual(len(response.context['comments']), 3)
+
+    def test_batch_indexed_by_keys(self):
+        """В поиск попадают комментарии пачки, даже если часы процесса
+        ушли вперёд относительно даты created."""
+        self.comment('Проиндексированный')
+        with mock.patch('posts.writebehind.timezone') as clock:
+            clock.now.return_value = timezone.now() + timedelta(minutes=5)
+            write_queue.drain()
+        self.assertEqual(
+            list(SearchResults('проиндексированный', Post.objects.all())),
+            [self.post],
+        )
+
+    def test_retried_batch_not_duplicated(self):
+        """Повтор пачки после сбоя не создаёт дублей комментариев."""
+        self.comment('Один раз')
+        apply(write_queue.claim(10))
+        # процесс упал до удаления строк из очереди
+        write_queue._connection().execute('UPDATE ops SET claimed = 1')
+        write_queue.drain()
+        self.assertEqual(self.post.comments.count(), 1)
+
+    def test_retry_keeps_identical_comments(self):
+        """Повтор пачки не съедает второй комментарий с тем же текстом."""
+        self.comment('Согласен')
+        apply(write_queue.claim(10))
+        self.comment('Согласен')
+        write_queue._connection().execute('UPDATE ops SET claimed = 1')
+        write_queue.drain()
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)),
+            ['Согласен', 'Согласен'],
+        )
+
+    def test_follow_and_unfollow_collapse(self):
+        """Подписка видна сразу, а подписка с отпиской схлопываются."""
+        follow = reverse('posts:profile_follow', args=['auth'])
+        unfollow = reverse('posts:profile_unfollow', args=['auth'])
+        profile = reverse('posts:profile', args=['auth'])
+        self.authorized_client.get(follow)
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(
+            self.authorized_client.get(profile).context['following']
+        )
+        self.authorized_client.get(unfollow)
+        self.authorized_client.get(follow)
+        write_queue.drain()
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author)
+            .count(),
+            1,
+        )
+        self.assertEqual(self.author.stats.followers_count, 1)
+
+        self.authorized_client.get(unfollow)
+        self.assertFalse(
+            self.authorized_client.get(profile).context['following']
+        )
+        write_queue.drain()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_concurrent_follow_counted_once(self):
+        """Подписка, появившаяся после проверки очереди, не считается
+        второй раз."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=['auth'])
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+
+        calls = []
+
+        def missed_first(pairs):
+            # первая проверка existing не видит подписку из запроса
+            calls.append(pairs)
+            return Q(pk__in=[]) if len(calls) == 1 else _pairs_filter(pairs)
+
+        with mock.patch('posts.writebehind._pairs_filter', missed_first):
+            write_queue.drain()
+        self.assertEqual(Follow.objects.count(), 1)
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(author.stats.followers_count, 1)
@@ -0,0 +1,224 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+При отрисовке страницы миниатюра только ищется в key-value хранилище
+sorl-thumbnail, для лент — сразу для всей страницы. Если её ещё нет,
+картинка ставится в локальную очередь, которую разбирает пул фоновых
+потоков, а страница пока показывает исходное изображение. Тот же
+воркер готовит адаптивные копии (см. posts.derivatives). Готовая
+миниатюра сбрасывает кэш карточек, а неудача запоминается в кэше, чтобы
+битая картинка не вставала в очередь снова на каждой отрисовке.
+Закрытые API sorl-thumbnail используются только в SorlAdapter.
+"""
+import hashlib
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .derivatives import generate_derivatives
+
+logger = logging.getLogger(__name__)
+
+FAILED_KEY = 'thumbnail_failed:{}'
+
+
+class SorlAdapter:
+    """Всё, что модулю нужно от sorl-thumbnail.
+
+    У sorl нет публичного способа узнать имя миниатюры, не открывая
+    картинку, и найти миниатюры целой страницы разом, поэтому здесь
+    используются его закрытые методы и устройство cached_db KVStore.
+    При обновлении sorl проверять нужно только этот класс.
+    """
+
+    def thumbnail_file(self, image):
+        """ImageFile миниатюры; имя считается так же, как в sorl, без PIL."""
+        backend = default.backend
+        source = ImageFile(image)
+        options = dict(settings.POST_THUMBNAIL_OPTIONS)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', backend._get_format(source))
+        for key, value in backend.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in backend.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = backend._get_thumbnail_filename(
+            source, settings.POST_THUMBNAIL_GEOMETRY, options
+        )
+        return ImageFile(name, default.storage)
+
+    def lookup(self, images):
+        """{имя картинки: URL миниатюры или None} одним get_many и
+        одним запросом к базе."""
+        kvstore = default.kvstore
+        if not isinstance(kvstore, cached_db_kvstore.KVStore):
+            urls = {}
+            for image in images:
+                cached = kvstore.get(self.thumbnail_file(image))
+                urls[image.name] = cached.url if cached else None
+            return urls
+        keys = {
+            add_prefix(self.thumbnail_file(image).key): image.name
+            for image in images
+        }
+        if not keys:
+            return {}
+        values = kvstore.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            values.update(found)
+            values.update(
+                (key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing if key not in found
+            )
+            kvstore.cache.set_many(
+                {key: values[key] for key in missing},
+                sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+            )
+        urls = {}
+        for key, name in keys.items():
+            value = values[key]
+            if value == cached_db_kvstore.EMPTY_VALUE or not value:
+                urls[name] = None
+            else:
+                urls[name] = deserialize_image_file(value).url
+        return urls
+
+    def generate(self, name):
+        get_thumbnail(
+            name,
+            settings.POST_THUMBNAIL_GEOMETRY,
+            **settings.POST_THUMBNAIL_OPTIONS
+        )
+
+
+sorl = SorlAdapter()
+
+
+def thumbnail_url(image):
+    """URL готовой миниатюры или None, если она ещё в очереди."""
+    if not image:
+        return None
+    url = sorl.lookup([image])[image.name]
+    if url is None:
+        enqueue(image.name)
+    return url
+
+
+def attach_thumbnails(posts):
+    """Находит миниатюры целой страницы одним get_many и одним запросом.
+
+    URL сохраняется в post.thumbnail_url; для промахов генерация ставится
+    в очередь, как и в thumbnail_url().
+    """
+    images = [post.image for post in posts if post.image]
+    urls = sorl.lookup(images)
+    for post in posts:
+        post.thumbnail_url = urls.get(post.image.name) if post.image else None
+    enqueue(*(name for name, url in urls.items() if url is None))
+    return posts
+
+
+def generate(name):
+    from .cache import bump, invalidate_cards, post_scopes
+    from .models import Post
+
+    sorl.generate(name)
+    digest, formats = generate_derivatives(name)
+    Post.objects.filter(image=name).update(
+        image_digest=digest,
+        image_formats=formats,
+        last_modified=timezone.now(),
+    )
+    posts = list(Post.objects.filter(image=name).only('author', 'group'))
+    invalidate_cards(post.pk for post in posts)
+    for post in posts:
+        bump(*post_scopes(post))
+
+
+class ThumbnailQueue:
+    def __init__(self, workers):
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def put(self, name):
+        with self.lock:
+            if name in self.pending:
+                return
+            self.pending.add(name)
+            if not self.threads:
+                self._start()
+        self.queue.put(name)
+
+    def _start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=f'thumbnails-{index}',
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            name = self.queue.get()
+            try:
+                generate(name)
+            except Exception:
+                logger.exception('Не удалось создать миниатюру %s', name)
+                # иначе битая картинка вставала бы в очередь на каждой
+                # отрисовке страницы
+                cache.set(
+                    _failed_key(name), True,
+                    settings.THUMBNAIL_FAILURE_TIMEOUT,
+                )
+            finally:
+                with self.lock:
+                    self.pending.discard(name)
+                connections.close_all()
+                self.queue.task_done()
+
+
+thumbnail_queue = ThumbnailQueue(settings.THUMBNAIL_WORKERS)
+
+
+def _failed_key(name):
+    return FAILED_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+def enqueue(*names):
+    """Ставит картинки в очередь после фиксации транзакции.
+
+    Картинки, которые недавно не удалось обработать, пропускаются на
+    THUMBNAIL_FAILURE_TIMEOUT секунд.
+    """
+    keys = {_failed_key(name): name for name in names if name}
+    if not keys:
+        return
+    failed = cache.get_many(list(keys))
+    for key, name in keys.items():
+        if key not in failed:
+            transaction.on_commit(
+                lambda name=name: thumbnail_queue.put(name)
+            )
@@ -1,11 +1,265 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from collections.abc import Sequence
+from urllib.parse import urlencode
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.cache import get_or_compute
+
+DEFAULT_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+# ?page=N старых ссылок: дальше этой страницы не смещаемся, OFFSET
+# больше 64-битного целого SQLite не примет
+MAX_PAGE_NUMBER = 100000
+# пределы INTEGER в SQLite
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+
+def _serialize(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values, reverse=False):
+    """Упаковывает позицию в ленте в непрозрачный токен для ?cursor=."""
+    payload = json.dumps(
+        {'v': None if values is None else [_serialize(v) for v in values],
+         'r': int(reverse)},
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (values, reverse) или None, если токен испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, reverse = payload['v'], bool(payload['r'])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if values is not None and not isinstance(values, list):
+        return None
+    return values, reverse
+
+
+def cached_count(queryset, timeout=None):
+    """COUNT(*) запроса, запомненный в кэше на timeout секунд."""
+    if timeout is None:
+        timeout = settings.PAGINATOR_COUNT_TIMEOUT
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = 'paginator_count:' + hashlib.md5(sql.encode()).hexdigest()
+    return get_or_compute(key, queryset.count, timeout)
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (keyset) вместо LIMIT/OFFSET.
+
+    Страница выбирается условием по полям сортировки относительно
+    последней показанной записи, поэтому тысячная страница стоит
+    столько же, сколько первая. Общее число записей не считается,
+    пока к нему не обратятся, и кэшируется.
+    """
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING,
+                 count_timeout=None):
+        directions = {name.startswith('-') for name in ordering}
+        if len(directions) != 1:
+            raise ValueError('Все поля сортировки должны иметь '
+                             'одинаковое направление.')
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = self.ordering[0].startswith('-')
+        if count_timeout is None:
+            count_timeout = settings.PAGINATOR_COUNT_TIMEOUT
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        """Приблизительное (кэшированное) число записей."""
+        return cached_count(self.object_list, self.count_timeout)
+
+    def get_page(self, cursor=None, number=None, params=None):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None and number:
+            return self._offset_page(number, params)
+        values, reverse = position or (None, False)
+        if values is not None:
+            try:
+                values = self._to_python(values)
+            except (ValidationError, ValueError, TypeError, OverflowError):
+                values, reverse = None, False
+        return self._page(values, reverse, params)
+
+    def key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [getattr(obj, field) for field in self.fields]
+
+    def _to_python(self, values):
+        if len(values) != len(self.fields):
+            raise ValueError('Неверная длина курсора.')
+        values = [
+            self._field(field).to_python(value)
+            for field, value in zip(self.fields, values)
+        ]
+        for value in values:
+            # курсор приходит от клиента: None и числа вне INTEGER
+            # уронили бы запрос, а не вернули первую страницу
+            if value is None:
+                raise ValueError('Пустое значение в курсоре.')
+            if isinstance(value, int) and not (
+                    MIN_INTEGER <= value <= MAX_INTEGER):
+                raise OverflowError('Число в курсоре вне диапазона.')
+        return values
+
+    def _field(self, name):
+        annotations = self.object_list.query.annotations
+        if name in annotations:
+            return annotations[name].output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        prefix = '' if self.descending else '-'
+        return tuple(prefix + field for field in self.fields)
+
+    def _seek(self, values, reverse):
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for previous, value in zip(self.fields[:index], values[:index]):
+                step &= Q(**{previous: value})
+            condition |= step
+        # условие по первому полю отдельно, чтобы SQLite искал по
+        # диапазону индекса, а не просматривал его с начала
+        return Q(**{f'{self.fields[0]}__{lookup}e': values[0]}) & condition
+
+    def _page(self, values, reverse, params):
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        queryset = queryset.order_by(*self._ordering(reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = has_more, values is not None
+        else:
+            has_previous, has_next = values is not None, has_more
+        return CursorPage(rows, self, has_previous, has_next, params)
+
+    def _offset_page(self, number, params):
+        """Старые ссылки вида ?page=N продолжают работать."""
+        try:
+            number = min(max(int(number), 1), MAX_PAGE_NUMBER)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        queryset = self.object_list.order_by(*self.ordering)
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self._page(None, True, params)
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page], self, number > 1, has_next, params
+        )
+
+
+class CursorPage(Sequence):
+    def __init__(self, object_list, paginator, has_previous, has_next,
+                 params=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.params = params.copy() if params is not None else None
+        if self.params is not None:
+            for name in ('cursor', 'page'):
+                self.params.pop(name, None)
+
+    def __repr__(self):
+        return '<CursorPage: %d objects>' % len(self)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.key(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(
+            self.paginator.key(self.object_list[0]), reverse=True
+        )
+
+    def _query(self, cursor=None):
+        params = {} if self.params is None else self.params.copy()
+        if cursor:
+            params['cursor'] = cursor
+        if not params:
+            return '?'
+        if hasattr(params, 'urlencode'):
+            return '?' + params.urlencode()
+        return '?' + urlencode(params)
+
+    @property
+    def first_page_query(self):
+        return self._query()
+
+    @property
+    def previous_page_query(self):
+        return self._query(self.previous_cursor)
+
+    @property
+    def next_page_query(self):
+        return self._query(self.next_cursor)
+
+    @property
+    def last_page_query(self):
+        return self._query(encode_cursor(None, reverse=True))
 
 
-def paginator(request, posts):
+def paginator(request, posts, ordering=DEFAULT_ORDERING):
 
-    paginator = Paginator(posts, settings.PAGINATOR_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, settings.PAGINATOR_PAGE, ordering)
+    page_obj = paginator.get_page(
+        request.GET.get('cursor'),
+        request.GET.get('page'),
+        params=request.GET,
+    )
 
     return page_obj
@@ -1,29 +1,100 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from . import writebehind
+from .cache import (anonymous_cache_page, attach_card_versions,
+                    conditional_page, depends_on)
+from .counters import stats_for
+from .feed import FEED_ORDERING, feed_for
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
+from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
+from .thumbnails import attach_thumbnails, enqueue
+from .utils import (COMMENT_ORDERING, DEFAULT_ORDERING, CursorPaginator,
+                    paginator)
 
 
-@cache_page(20, key_prefix="index_page")
+def _comments_page(request, post_id):
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related('author')
+        .only('text', 'created', 'author__username')
+    )
+    return CursorPaginator(
+        comments, settings.COMMENTS_PAGE, COMMENT_ORDERING
+    ).get_page(request.GET.get('cursor'), params=request.GET)
+
+
+def _feed_page(request, post_list, ordering=DEFAULT_ORDERING):
+    page_obj = paginator(request, post_list, ordering)
+    attach_card_versions(page_obj)
+    attach_thumbnails(page_obj)
+    return page_obj
+
+
+@anonymous_cache_page
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group').all()
-    page_obj = paginator(request, post_list)
+    depends_on(request, 'posts')
+    post_list = Post.objects.for_feed()
+    page_obj = _feed_page(request, post_list)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+def _last_modified(**lookup):
+    # ORDER BY ... LIMIT 1 читает одну запись индекса (..., last_modified)
+    return Subquery(
+        Post.objects.filter(**lookup).order_by('-last_modified')
+        .values('last_modified')[:1]
+    )
+
+
+def _group_state(request, slug):
+    group = (Group.objects.filter(slug=slug)
+             .annotate(modified=_last_modified(group=OuterRef('pk')))
+             .values_list('pk', 'modified').first())
+    if group is None:
+        return None
+    pk, modified = group
+    return (f'group:{pk}', f'group:{pk}:meta'), modified
+
+
+def _profile_state(request, username):
+    author = (User.objects.filter(username=username)
+              .annotate(modified=_last_modified(author=OuterRef('pk')))
+              .values_list('pk', 'modified').first())
+    if author is None:
+        return None
+    pk, modified = author
+    return (f'author:{pk}',), modified
+
+
+def _post_state(request, post_id):
+    post = (Post.objects.filter(pk=post_id)
+            .values_list('author_id', 'group_id', 'last_modified').first())
+    if post is None:
+        return None
+    author_id, group_id, modified = post
+    scopes = [f'post:{post_id}', f'author:{author_id}']
+    if group_id:
+        scopes.append(f'group:{group_id}:meta')
+    return scopes, modified
+
+
+@anonymous_cache_page
+@conditional_page(_group_state)
 def group_posts(request, slug):
 
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts)
+    depends_on(request, f'group:{group.pk}', f'group:{group.pk}:meta')
+    posts = Post.objects.for_feed().filter(group=group)
+    page_obj = _feed_page(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -31,38 +102,87 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@anonymous_cache_page
+@conditional_page(_profile_state)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=user)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    depends_on(request, f'author:{user.pk}')
+    post_list = Post.objects.for_feed().filter(author=user)
     following = False
     if request.user.is_authenticated:
-        following = (Follow.objects.filter(user=request.user, author=user)
-                     .exists())
-    page_obj = paginator(request, post_list)
-    post_count = Post.objects.filter(author=user).count()
+        following = None
+        if settings.WRITE_BEHIND:
+            following = writebehind.pending_following(request.user, user)
+        if following is None:
+            following = (Follow.objects.filter(user=request.user, author=user)
+                         .exists())
+    page_obj = _feed_page(request, post_list)
     context = {
         'author': user,
         'page_obj': page_obj,
-        'post_count': post_count,
+        'stats': stats_for(user),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@anonymous_cache_page
+@conditional_page(_post_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    depends_on(request, f'post:{post_id}')
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    depends_on(request, f'author:{post.author_id}')
+    if post.group_id:
+        depends_on(request, f'group:{post.group_id}:meta')
+    comments = _comments_page(request, post.pk)
+    if (settings.WRITE_BEHIND and request.user.is_authenticated
+            and not comments.has_next()):
+        # свои комментарии из очереди видны сразу
+        comments.object_list += writebehind.pending_comments(
+            request.user, post
+        )
     form = CommentForm()
-    post_count = Post.objects.filter(author=post.author).count()
     context = {
         'post': post,
         'form': form,
         'comments': comments,
-        'post_count': post_count
+        'post_count': stats_for(post.author).posts_count
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на странице поста."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': _comments_page(request, post_id),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_posts(
+        query,
+        Post.objects.for_feed(),
+        settings.PAGINATOR_PAGE,
+        request.GET.get('page'),
+        params=request.GET,
+    )
+    attach_card_versions(page_obj)
+    attach_thumbnails(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     is_edit = False
@@ -73,7 +193,8 @@ def post_create(request):
     if form.is_valid():
         author = request.user
         form.instance.author = author
-        form.save()
+        post = form.save()
+        enqueue(post.image.name)
         return redirect('posts:profile', username=author)
 
     form = PostForm()
@@ -106,6 +227,8 @@ def post_edit(request, post_id):
 
     author = request.user
     form.save()
+    if 'image' in form.changed_data:
+        enqueue(post.image.name)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -114,7 +237,11 @@ def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
 
-    if form.is_valid():
+    if form.is_valid() and settings.WRITE_BEHIND:
+        writebehind.add_comment(
+            request.user, post, form.cleaned_data['text']
+        )
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -125,8 +252,8 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, post_list)
+    post_list = feed_for(request.user).for_feed()
+    page_obj = _feed_page(request, post_list, FEED_ORDERING)
     context = {
         'page_obj': page_obj,
     }
@@ -136,7 +263,9 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
+    if request.user != author and settings.WRITE_BEHIND:
+        writebehind.follow(request.user, author)
+    elif request.user != author:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
@@ -144,5 +273,8 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    get_object_or_404(Follow, user=request.user, author=author).delete()
+    if settings.WRITE_BEHIND:
+        writebehind.unfollow(request.user, author)
+    else:
+        get_object_or_404(Follow, user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
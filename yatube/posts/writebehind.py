@@ -0,0 +1,348 @@
+"""Отложенная запись комментариев и подписок (write-behind).
+
+В режиме WRITE_BEHIND запрос не пишет в основную базу: действие
+ложится в локальную очередь — отдельный файл SQLite, который переживает
+перезапуск процесса, — а пользователь сразу видит свой комментарий и
+подписку (read-your-writes). Фоновый поток ждёт WRITE_BEHIND_DELAY
+секунд, чтобы собрать пачку, и применяет её одной транзакцией:
+комментарии — bulk_create, подписки — bulk_create(ignore_conflicts=True)
+и одно удаление, причём подписка и отписка одной пары схлопываются.
+
+Строки очереди удаляются после фиксации транзакции. Если процесс упал
+между фиксацией и удалением, строки снова забираются через
+CLAIM_TIMEOUT секунд. У каждого действия есть случайный ключ, который
+сохраняется в Comment.idempotency_key, поэтому уже созданные
+комментарии не дублируются, а два одинаковых комментария остаются
+двумя.
+Очередь можно разобрать и вручную: ``manage.py apply_writes``.
+"""
+import collections
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.backends.sqlite3.base import apply_pragmas
+
+from . import counters, search
+from .cache import bump, invalidate_on_commit, post_scopes
+from .models import Comment, Follow, Post, User
+
+logger = logging.getLogger(__name__)
+
+COMMENT = 'comment'
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+CLAIM_TIMEOUT = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ops (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    created TEXT NOT NULL,
+    claimed REAL,
+    key TEXT
+);
+CREATE INDEX IF NOT EXISTS ops_user_idx ON ops (user_id, kind, target_id);
+'''
+# подтверждённое действие не должно пропасть и при отключении питания
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+Op = collections.namedtuple(
+    'Op', 'id kind user_id target_id text created key retried'
+)
+
+
+def user_scope(user_id):
+    """Область кэша, которая меняется с каждым действием пользователя."""
+    return f'user:{user_id}'
+
+
+class WriteQueue:
+    def __init__(self):
+        self.local = threading.local()
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _connection(self):
+        path = settings.WRITE_BEHIND_QUEUE
+        opened = self.local.__dict__.setdefault('connections', {})
+        if path not in opened:
+            connection = sqlite3.connect(
+                path, timeout=5, isolation_level=None
+            )
+            apply_pragmas(connection, PRAGMAS)
+            connection.executescript(SCHEMA)
+            self._add_keys(connection)
+            opened[path] = connection
+        return opened[path]
+
+    def _add_keys(self, connection):
+        # очередь, созданная до появления ключей действий
+        columns = [row[1] for row in connection.execute(
+            'PRAGMA table_info(ops)'
+        )]
+        if 'key' not in columns:
+            connection.execute('ALTER TABLE ops ADD COLUMN key TEXT')
+        connection.execute(
+            'UPDATE ops SET key = lower(hex(randomblob(16))) '
+            'WHERE key IS NULL'
+        )
+
+    def put(self, kind, user_id, target_id, text=''):
+        self._connection().execute(
+            'INSERT INTO ops (kind, user_id, target_id, text, created, key) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (kind, user_id, target_id, text, timezone.now().isoformat(),
+             uuid.uuid4().hex),
+        )
+
+    def pending(self, user_id, kind, target_id):
+        rows = self._connection().execute(
+            'SELECT text, created FROM ops '
+            'WHERE user_id = ? AND kind = ? AND target_id = ? ORDER BY id',
+            (user_id, kind, target_id),
+        )
+        return [(text, parse_datetime(created)) for text, created in rows]
+
+    def last_follow(self, user_id, author_id):
+        row = self._connection().execute(
+            'SELECT kind FROM ops WHERE user_id = ? AND target_id = ? '
+            'AND kind IN (?, ?) ORDER BY id DESC LIMIT 1',
+            (user_id, author_id, FOLLOW, UNFOLLOW),
+        ).fetchone()
+        return row[0] if row else None
+
+    def claim(self, limit):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                'SELECT id, kind, user_id, target_id, text, created, key, '
+                'claimed FROM ops WHERE claimed IS NULL OR claimed < ? '
+                'ORDER BY id LIMIT ?',
+                (now - CLAIM_TIMEOUT, limit),
+            ).fetchall()
+            connection.executemany(
+                'UPDATE ops SET claimed = ? WHERE id = ?',
+                [(now, row[0]) for row in rows],
+            )
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return [
+            Op(*row[:5], parse_datetime(row[5]), row[6], row[7] is not None)
+            for row in rows
+        ]
+
+    def finish(self, ops, applied=True):
+        sql = ('DELETE FROM ops WHERE id = ?' if applied
+               else 'UPDATE ops SET claimed = NULL WHERE id = ?')
+        self._connection().executemany(sql, [(op.id,) for op in ops])
+
+    def drain(self):
+        """Применяет всё, что есть в очереди; возвращает число действий."""
+        applied = 0
+        while True:
+            ops = self.claim(settings.WRITE_BEHIND_BATCH)
+            if not ops:
+                return applied
+            try:
+                apply(ops)
+            except Exception:
+                self.finish(ops, applied=False)
+                raise
+            self.finish(ops)
+            applied += len(ops)
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._work, name='write-behind', daemon=True
+                )
+                self.thread.start()
+        self.wakeup.set()
+
+    def _work(self):
+        while True:
+            self.wakeup.wait()
+            # даём накопиться соседним действиям, чтобы писать пачкой
+            time.sleep(settings.WRITE_BEHIND_DELAY)
+            self.wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception('Не удалось применить отложенные записи')
+                time.sleep(settings.WRITE_BEHIND_DELAY)
+                self.wakeup.set()
+            finally:
+                connections.close_all()
+
+
+write_queue = WriteQueue()
+
+
+def _enqueue(kind, user_id, target_id, text=''):
+    write_queue.put(kind, user_id, target_id, text)
+    bump(user_scope(user_id))
+    transaction.on_commit(write_queue.wake)
+
+
+def add_comment(user, post, text):
+    _enqueue(COMMENT, user.pk, post.pk, text)
+
+
+def follow(user, author):
+    _enqueue(FOLLOW, user.pk, author.pk)
+
+
+def unfollow(user, author):
+    _enqueue(UNFOLLOW, user.pk, author.pk)
+
+
+def pending_comments(user, post):
+    """Ещё не записанные комментарии пользователя к посту."""
+    return [
+        Comment(post=post, author=user, text=text, created=created)
+        for text, created in write_queue.pending(user.pk, COMMENT, post.pk)
+    ]
+
+
+def pending_following(user, author):
+    """True/False, если пользователь (от)писался и это ещё в очереди."""
+    kind = write_queue.last_follow(user.pk, author.pk)
+    return None if kind is None else kind == FOLLOW
+
+
+def _pairs_filter(pairs):
+    condition = Q()
+    for user_id, author_id in pairs:
+        condition |= Q(user_id=user_id, author_id=author_id)
+    return condition
+
+
+def _alive(ops, *id_fields):
+    """Отбрасывает действия над удалёнными пользователями."""
+    ids = {getattr(op, field) for op in ops for field in id_fields}
+    users = set(
+        User.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    )
+    return [
+        op for op in ops
+        if all(getattr(op, field) in users for field in id_fields)
+    ]
+
+
+def _apply_comments(ops):
+    if not ops:
+        return
+    posts = Post.objects.filter(
+        pk__in={op.target_id for op in ops}
+    ).only('author', 'group').in_bulk()
+    ops = [
+        op for op in _alive(ops, 'user_id') if op.target_id in posts
+    ]
+    retried = [op.key for op in ops if op.retried]
+    if retried:
+        # пачка могла быть записана перед падением процесса
+        written = set(
+            Comment.objects.filter(idempotency_key__in=retried)
+            .values_list('idempotency_key', flat=True)
+        )
+        ops = [op for op in ops if op.key not in written]
+    if not ops:
+        return
+    Comment.objects.bulk_create(
+        [
+            Comment(
+                post_id=op.target_id,
+                author_id=op.user_id,
+                text=op.text,
+                idempotency_key=op.key,
+            )
+            for op in ops
+        ],
+        batch_size=settings.WRITE_BEHIND_BATCH,
+    )
+    # bulk_create не шлёт сигналов: счётчики, поиск и кэш обновляются
+    # здесь, по одному разу на пост
+    per_post = collections.Counter(op.target_id for op in ops)
+    for post_id, added in per_post.items():
+        counters.change_comments(post_id, added)
+    search.index(
+        (search.comment_rowid(pk), post_id, text)
+        for pk, post_id, text in Comment.objects.filter(
+            idempotency_key__in=[op.key for op in ops]
+        ).values_list('pk', 'post_id', 'text')
+    )
+    invalidate_on_commit(
+        per_post,
+        set().union(*(post_scopes(posts[pk]) for pk in per_post)),
+    )
+
+
+def _apply_follows(ops):
+    wanted = {}
+    for op in _alive(ops, 'user_id', 'target_id'):
+        if op.user_id != op.target_id:
+            wanted[op.user_id, op.target_id] = op.kind == FOLLOW
+    if not wanted:
+        return
+    existing = set(
+        Follow.objects.filter(_pairs_filter(wanted))
+        .values_list('user_id', 'author_id')
+    )
+    using = router.db_for_write(Follow)
+    inserted = []
+    with connections[using].cursor() as cursor:
+        for (user_id, author_id), follows in wanted.items():
+            if not follows or (user_id, author_id) in existing:
+                continue
+            # подписка могла появиться после чтения existing; rowcount
+            # показывает, вставлена ли строка именно здесь
+            cursor.execute(
+                f'INSERT OR IGNORE INTO {Follow._meta.db_table} '
+                f'(user_id, author_id) VALUES (%s, %s)',
+                [user_id, author_id],
+            )
+            if cursor.rowcount:
+                inserted.append((user_id, author_id))
+    if inserted:
+        created = Follow.objects.using(using).filter(_pairs_filter(inserted))
+        for instance in created:
+            # счётчики, лента подписок и кэш — в обработчиках сигналов
+            post_save.send(
+                sender=Follow, instance=instance, created=True,
+                update_fields=None, raw=False, using=using,
+            )
+    removed = [
+        pair for pair, follows in wanted.items()
+        if not follows and pair in existing
+    ]
+    if removed:
+        Follow.objects.filter(_pairs_filter(removed)).delete()
+
+
+def apply(ops):
+    with transaction.atomic():
+        _apply_comments([op for op in ops if op.kind == COMMENT])
+        _apply_follows([op for op in ops if op.kind != COMMENT])
@@ -0,0 +1,22 @@
+// Подгружает следующую страницу комментариев вместо перехода по ссылке.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.comments-more');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('afterend', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location.href = link.href;
+    });
+});
@@ -0,0 +1,31 @@
+"""Бэкенд аутентификации, который берёт пользователя из кэша.
+
+AuthenticationMiddleware на каждом запросе загружает пользователя по id
+из сессии. Здесь строка auth_user кэшируется на USER_CACHE_TIMEOUT
+секунд, а сигналы (см. users.signals) сбрасывают её при любом
+сохранении или удалении пользователя: смене пароля или профиля, входе.
+Сессии тоже лежат в кэше (SESSION_ENGINE = cached_db), поэтому
+страница для вошедшего пользователя не обращается к базе за ним.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_KEY = 'auth_user:{}'
+
+
+def forget_user(user_id):
+    cache.delete(USER_KEY.format(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        # неактивного пользователя выкидывает и закэшированная копия
+        return user if self.user_can_authenticate(user) else None
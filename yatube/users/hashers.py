@@ -0,0 +1,105 @@
+"""Хэширование паролей scrypt в ограниченном пуле потоков.
+
+PBKDF2 из коробки тратит на вход десятки миллисекунд чистого CPU.
+scrypt требует ещё и памяти (128 * n * r байт), поэтому при меньшем
+времени устойчивее к перебору на GPU; параметры задаются в настройках
+PASSWORD_SCRYPT и подбираются командой tune_password_hasher. Формат
+хэша совпадает с ScryptPasswordHasher из новых версий Django.
+
+hashlib отпускает GIL на время вычисления, а пул из
+PASSWORD_HASH_WORKERS потоков ограничивает, сколько хэшей считается
+одновременно: всплеск входов ждёт в очереди и не отнимает процессор у
+остальных страниц. Пароли со старым алгоритмом или параметрами
+перехэшируются при входе: это делает check_password Django, если
+хэшер из PASSWORD_HASHERS[0] отличается или must_update() вернул True.
+"""
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import BasePasswordHasher, mask_hash
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix='password-hash',
+            )
+    return _executor
+
+
+def scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt.encode(),
+        n=n,
+        r=r,
+        p=p,
+        # по умолчанию OpenSSL не даёт больше 32 МиБ
+        maxmem=256 * n * r * p,
+        dklen=64,
+    )
+
+
+class ScryptPasswordHasher(BasePasswordHasher):
+    algorithm = 'scrypt'
+
+    @property
+    def params(self):
+        return settings.PASSWORD_SCRYPT
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        n = n or self.params['n']
+        r = r or self.params['r']
+        p = p or self.params['p']
+        digest = executor().submit(scrypt, password, salt, n, r, p).result()
+        digest = base64.b64encode(digest).decode('ascii')
+        return f'{self.algorithm}${n}${salt}${r}${p}${digest}'
+
+    def decode(self, encoded):
+        algorithm, n, salt, r, p, digest = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'n': int(n), 'salt': salt, 'r': int(r), 'p': int(p),
+            'hash': digest,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        expected = self.encode(
+            password, decoded['salt'],
+            decoded['n'], decoded['r'], decoded['p'],
+        )
+        return constant_time_compare(encoded, expected)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): self.algorithm,
+            _('work factor'): decoded['n'],
+            _('block size'): decoded['r'],
+            _('parallelism'): decoded['p'],
+            _('salt'): mask_hash(decoded['salt']),
+            _('hash'): mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return any(decoded[name] != self.params[name] for name in 'nrp')
+
+    def harden_runtime(self, password, encoded):
+        # время проверки с устаревшими параметрами выравнивать незачем:
+        # после входа хэш всё равно пересчитается с текущими
+        pass
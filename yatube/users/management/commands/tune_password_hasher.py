@@ -0,0 +1,57 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.hashers import scrypt
+
+
+class Command(BaseCommand):
+    help = ('Замеряет scrypt на этой машине и подсказывает наибольший '
+            'YATUBE_SCRYPT_N, укладывающийся в заданное время хэша.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms', type=float, default=30.0,
+            help='Сколько миллисекунд CPU можно тратить на один вход.',
+        )
+        parser.add_argument('--max-log-n', type=int, default=17)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести результат в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        r = settings.PASSWORD_SCRYPT['r']
+        p = settings.PASSWORD_SCRYPT['p']
+        results = []
+        for log_n in range(10, options['max_log_n'] + 1):
+            n = 2 ** log_n
+            started = time.perf_counter()
+            for _ in range(options['rounds']):
+                scrypt('password', 'salt', n, r, p)
+            elapsed = (time.perf_counter() - started) / options['rounds']
+            results.append({
+                'n': n,
+                'memory_mib': 128 * n * r * p / 2 ** 20,
+                'ms': elapsed * 1000,
+            })
+            if elapsed * 1000 > options['target_ms'] * 2:
+                break
+        fitting = [row for row in results if row['ms'] <= options['target_ms']]
+        best = fitting[-1]['n'] if fitting else results[0]['n']
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {'results': results, 'recommended_n': best}, indent=2
+            ))
+            return
+        for row in results:
+            self.stdout.write(
+                'n={n:>7}: {memory_mib:6.1f} МиБ, {ms:7.1f} мс'.format(**row)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендуется YATUBE_SCRYPT_N={best} '
+            f'(сейчас {settings.PASSWORD_SCRYPT["n"]}).'
+        ))
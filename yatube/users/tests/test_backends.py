@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+User = get_user_model()
+
+
+class CachedAuthenticationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='reader', password='old-password-123'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.page = reverse('about:author')
+        self.client.get(self.page)
+
+    def user_of_next_request(self):
+        return self.client.get(self.page).wsgi_request.user
+
+    def test_logged_in_page_without_auth_queries(self):
+        """Сессия и пользователь вошедшего берутся из кэша."""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.page)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_profile_change_is_visible(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Лев'
+        user.save()
+        self.assertEqual(self.user_of_next_request().first_name, 'Лев')
+
+    def test_password_change_logs_out_other_sessions(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password-456')
+        user.save()
+        self.assertFalse(self.user_of_next_request().is_authenticated)
+
+    def test_deactivated_user_is_logged_out(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertFalse(self.user_of_next_request().is_authenticated)
+
+    def test_login_with_password(self):
+        client = Client()
+        self.assertTrue(
+            client.login(username='reader', password='old-password-123')
+        )
+        self.assertEqual(
+            client.get(self.page).wsgi_request.user, self.user
+        )
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import (check_password, identify_hasher,
+                                         make_password)
+from django.core.exceptions import ValidationError
+from django.test import Client, TestCase, override_settings
+
+from ..validators import CommonPasswordValidator
+
+User = get_user_model()
+PASSWORD = 'correct-horse-battery'
+
+
+class PasswordHashingTest(TestCase):
+    def login(self, user):
+        self.assertTrue(
+            Client().login(username=user.username, password=PASSWORD)
+        )
+        user.refresh_from_db()
+        return user.password
+
+    def test_scrypt_is_default(self):
+        encoded = make_password(PASSWORD)
+        self.assertTrue(
+            encoded.startswith(f'scrypt${settings.PASSWORD_SCRYPT["n"]}$')
+        )
+        self.assertTrue(check_password(PASSWORD, encoded))
+        self.assertFalse(check_password('wrong', encoded))
+
+    def test_old_hash_is_upgraded_on_login(self):
+        """Пароль с PBKDF2 при входе перехэшируется в scrypt."""
+        user = User.objects.create(
+            username='old',
+            password=make_password(PASSWORD, hasher='pbkdf2_sha256'),
+        )
+        encoded = self.login(user)
+        self.assertEqual(identify_hasher(encoded).algorithm, 'scrypt')
+
+    def test_new_parameters_rehash_on_login(self):
+        user = User.objects.create_user(username='reader', password=PASSWORD)
+        with override_settings(PASSWORD_SCRYPT={'n': 4096, 'r': 8, 'p': 1}):
+            encoded = self.login(user)
+        self.assertTrue(encoded.startswith('scrypt$4096$'))
+
+
+class CommonPasswordValidatorTest(TestCase):
+    def test_word_list_loaded_once(self):
+        first, second = CommonPasswordValidator(), CommonPasswordValidator()
+        self.assertIsInstance(first.passwords, frozenset)
+        self.assertIs(first.passwords, second.passwords)
+
+    def test_common_password_rejected(self):
+        validator = CommonPasswordValidator()
+        with self.assertRaises(ValidationError):
+            validator.validate('password')
+        validator.validate(PASSWORD)
@@ -0,0 +1,25 @@
+import functools
+import gzip
+
+from django.contrib.auth import password_validation
+
+
+@functools.lru_cache(maxsize=None)
+def common_passwords(path):
+    """Список частых паролей, прочитанный один раз на процесс."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            lines = stream.read().split('\n')
+    except OSError:
+        with open(path, encoding='utf-8') as stream:
+            lines = stream.readlines()
+    return frozenset(line.strip() for line in lines if line.strip())
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    """То же, что в Django, но словарь общий для всех экземпляров."""
+
+    def __init__(self, password_list_path=None):
+        self.passwords = common_passwords(
+            str(password_list_path or self.DEFAULT_PASSWORD_LIST_PATH)
+        )
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import warnings
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'about.apps.AboutConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,13 +52,53 @@ INSTALLED_APPS = [
 ]
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Общий для всех воркеров кэш выбирается переменной окружения
+# YATUBE_CACHE: locmem (по умолчанию), file, memcached или redis.
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE', 'locmem')
+CACHE_LOCATION = os.environ.get('YATUBE_CACHE_LOCATION')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+elif CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+            'LOCATION': CACHE_LOCATION or '127.0.0.1:11211',
+            'OPTIONS': {
+                'binary': True,
+                'behaviors': {'tcp_nodelay': True, 'ketama': True},
+            },
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    # django-redis держит один пул соединений на процесс
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {'max_connections': 50},
+                'SOCKET_CONNECT_TIMEOUT': 1,
+                'SOCKET_TIMEOUT': 1,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,7 +118,7 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -99,10 +141,17 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# YATUBE_SQLITE_TUNING=0 возвращает стандартный бэкенд без PRAGMA-настроек
+SQLITE_TUNING = os.environ.get('YATUBE_SQLITE_TUNING', '1') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': (
+            'core.backends.sqlite3' if SQLITE_TUNING
+            else 'django.db.backends.sqlite3'
+        ),
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
     }
 }
 
@@ -118,7 +167,7 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'users.validators.CommonPasswordValidator',
     },
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
@@ -126,6 +175,36 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Хэширование паролей: YATUBE_PASSWORD_HASHER выбирает алгоритм для новых
+# хэшей (scrypt, argon2 — нужен argon2-cffi, или pbkdf2); остальные
+# остаются в списке, чтобы проверять старые хэши и перехэшировать их при
+# входе. Параметры scrypt подбирает manage.py tune_password_hasher.
+PASSWORD_HASHER = os.environ.get('YATUBE_PASSWORD_HASHER', 'scrypt')
+_HASHERS = {
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+if PASSWORD_HASHER not in _HASHERS:
+    warnings.warn(
+        f'YATUBE_PASSWORD_HASHER={PASSWORD_HASHER!r} не поддерживается '
+        f'(допустимы {", ".join(_HASHERS)}), используется scrypt'
+    )
+    PASSWORD_HASHER = 'scrypt'
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PASSWORD_SCRYPT = {
+    'n': int(os.environ.get('YATUBE_SCRYPT_N', 2 ** 13)),
+    'r': 8,
+    'p': 1,
+}
+# сколько хэшей паролей считается одновременно
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get('YATUBE_PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -141,6 +220,26 @@ USE_TZ = True
 
 PAGINATOR_PAGE = 10
 
+COMMENTS_PAGE = 50
+# сколько секунд держать в кэше приблизительное число записей ленты
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+
+# лента подписок: авторы с большим числом подписчиков читаются напрямую
+FEED_FANOUT_LIMIT = 5000
+FEED_CELEBRITIES_TIMEOUT = 60 * 5
+FEED_BATCH_SIZE = 500
+
+# карточки постов кэшируются по версии, поэтому могут жить долго
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# страницы для анонимов сбрасываются записью, TTL лишь страховка
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+
+# сессии читаются из кэша, а в базу пишутся сразу (write-through);
+# пользователь по id из сессии тоже берётся из кэша, см. users.backends
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = 60 * 15
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:main'
@@ -150,6 +249,43 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# сюда collectstatic собирает файлы с отпечатками и сжатыми копиями,
+# отсюда их раздаёт core.static (см. yatube/wsgi.py)
+STATIC_ROOT = os.environ.get(
+    'YATUBE_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles')
+)
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+# файлы с отпечатком в имени не меняются: кэшировать их можно на год
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+
+# миниатюры картинок постов готовятся в фоне, см. posts.thumbnails
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_WORKERS = 2
+# картинку, которую не удалось обработать, час не ставим в очередь снова
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 60
+# ширины адаптивных копий для srcset (WebP/AVIF/JPEG)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_QUALITY = 80
+
+# YATUBE_WRITE_BEHIND=1 включает отложенную пакетную запись комментариев
+# и подписок, см. posts.writebehind
+WRITE_BEHIND = os.environ.get('YATUBE_WRITE_BEHIND') == '1'
+WRITE_BEHIND_QUEUE = os.path.join(BASE_DIR, 'writebehind.sqlite3')
+WRITE_BEHIND_BATCH = 500
+WRITE_BEHIND_DELAY = 0.5
+
+# массовые действия модератора выполняются в фоне пачками по столько строк
+MODERATION_CHUNK_SIZE = 500
+
+# замеры запросов (core.middleware): какая доля запросов замеряется,
+# сколько последних замеров каждого представления хранить и после
+# скольких одинаковых SQL-запросов предупреждать о N+1
+PERF_SAMPLE_RATE = float(
+    os.environ.get('YATUBE_PERF_SAMPLE_RATE', 1.0 if DEBUG else 0.01)
+)
+PERF_WINDOW = 1000
+PERF_DUPLICATE_THRESHOLD = 5
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')